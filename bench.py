@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+"""
+Loader benchmarks on fakeoxc.py generated installations.
+
+    bench.py --save base.json             # on the commit to compare against
+    bench.py --baseline base.json         # on yours
+
+Times load_ruleset() without and with the caches, merge() of a big
+keyed section, Finder.glob() and after_load_checks() at each --scale,
+best of --repeat runs. The trees are generated under --workdir once
+and reused while the parameters stay the same.
+
+Baselines are whatever the machine they were saved on did, so don't
+compare across machines and don't check them in.
+"""
+
+import os, sys, io, argparse, contextlib, copy, json, time, platform, shutil, statistics
+import modloader, fakeoxc
+
+# name: (mods, rule files per mod, entities per file)
+SCALES = {
+    'small':  (5,   5,  50),
+    'medium': (20, 10, 100),
+    'large':  (60, 20, 200),
+}
+
+def tree(workdir, scale):
+    """ generate the tree for the scale unless it's there already """
+    root = os.path.join(workdir, scale)
+    params = json.dumps(SCALES[scale])
+    stamp = os.path.join(root, 'fakeoxc.params')
+    if os.path.exists(stamp) and open(stamp).read() == params:
+        return root
+    if os.path.exists(root):
+        shutil.rmtree(root)
+    mods, files, entities = SCALES[scale]
+    print("generating {} tree: {} mods x {} files x {} entities".format(scale, mods, files, entities))
+    fakeoxc.Generator(root, mods, files, entities).generate()
+    with open(stamp, "w") as f:
+        f.write(params)
+    return root
+
+def timeit(fn, repeat, setup = None):
+    """ (best, median) wall seconds; setup() runs untimed before each run and its result goes to fn() """
+    times = []
+    for i in range(repeat):
+        arg = setup() if setup is not None else None
+        with contextlib.redirect_stdout(io.StringIO()):
+            st = time.perf_counter()
+            fn(arg)
+            times.append(time.perf_counter() - st)
+    return min(times), statistics.median(times)
+
+def bench_scale(root, repeat):
+    results = {}
+    cachedir = os.path.join(root, 'user', modloader.CACHE_DIRNAME)
+
+    def load(cache):
+        def run(arg):
+            del modloader.STRICT.errors[:]
+            modloader.load_ruleset(root, cache = cache)
+        return run
+
+    results['load_ruleset'] = timeit(load(False), repeat)
+    with contextlib.redirect_stdout(io.StringIO()):
+        if os.path.exists(cachedir):
+            shutil.rmtree(cachedir)
+        modloader.load_ruleset(root, cache = True) # warm up the caches
+        ruleset = modloader.load_ruleset(root, cache = False)
+        finder = modloader.installation_finder(root, cache = False)
+    results['load_ruleset cached'] = timeit(load(True), repeat)
+
+    # everything but the last third of the items, updated by half of them plus as many new ones
+    items = ruleset['items']
+    left = items[:len(items) * 2 // 3]
+    right = [dict(it, costBuy = 1) for it in items[len(items) // 3:]]
+    results['merge items'] = timeit(lambda lr: modloader.merge(1, 'type', lr[0], lr[1]), repeat,
+                                    lambda: (copy.deepcopy(left), copy.deepcopy(right)))
+
+    roots = [md['root'] for md in ruleset['_mod_meta']]
+    def glob(arg):
+        finder.glob('Ruleset/*.rul', roots)
+        finder.glob('ruleset/RULES00?.RUL', roots)
+        finder.glob_data('UFOGRAPH/*.PCK')
+        finder.glob_data('TERRAIN/CULTIVAT.MCD')
+    results['Finder.glob'] = timeit(glob, repeat)
+
+    def checks(arg):
+        del modloader.STRICT.errors[:]
+        modloader.after_load_checks(ruleset)
+    results['after_load_checks'] = timeit(checks, repeat)
+    return results
+
+def compare(results, baseline, tolerance):
+    """ prints the table, returns the number of regressions """
+    regressions = 0
+    print("{:32} {:>10} {:>10} {:>10}".format('benchmark', 'best', 'baseline', 'ratio'))
+    for name, (best, median) in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print("{:32} {:10.4f} {:>10} {:>10}".format(name, best, '-', '-'))
+            continue
+        ratio = best / base[0] if base[0] > 0 else float('inf')
+        mark = ''
+        if ratio > 1 + tolerance:
+            mark = ' SLOWER'
+            regressions += 1
+        elif ratio < 1 - tolerance:
+            mark = ' faster'
+        print("{:32} {:10.4f} {:10.4f} {:10.2f}{}".format(name, best, base[0], ratio, mark))
+    return regressions
+
+def main(argv = None):
+    pa = argparse.ArgumentParser("bench.py", description = "time the loader on generated installations")
+    pa.add_argument("--scale", action = "append", choices = sorted(SCALES), help = "repeatable; default small and medium")
+    pa.add_argument("--repeat", "-r", type = int, default = 3, help = "runs per benchmark, the best one counts")
+    pa.add_argument("--workdir", default = os.path.join('user', 'minicom-bench'), help = "where the generated trees live")
+    pa.add_argument("--baseline", "-b", help = "compare to the results saved here")
+    pa.add_argument("--save", "-s", help = "save the results here, to be a baseline later")
+    pa.add_argument("--tolerance", type = float, default = 0.1, help = "ratio off 1.0 that counts as a change")
+    args = pa.parse_args(argv)
+
+    modloader.STRICT.do_raise(False)
+    results = {}
+    for scale in args.scale or ('small', 'medium'):
+        root = tree(args.workdir, scale)
+        for name, rv in bench_scale(root, args.repeat).items():
+            results["{}/{}".format(scale, name)] = rv
+
+    baseline = {}
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.save is not None:
+        with open(args.save, "w") as f:
+            json.dump({ 'python': sys.version, 'platform': platform.platform(), 'repeat': args.repeat,
+                        'results': results }, f, indent = 1)
+        print("saved to {}".format(args.save))
+    return 1 if regressions > 0 else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+
+"""
+What items really cost to make: money, engineer hours and the raw
+materials, expanded through every manufacture project that makes the inputs.
+
+    modloader.py costs oxc/root                       # everything, priciest first
+    modloader.py costs oxc/root STR_AVALANCHE_LAUNCHER
+    modloader.py costs ruleset.rsec --cycles
+
+Items no project produces are raw materials. Per unit of a produced
+item, a project's cost, time and requiredItems are divided by how many of
+it the project makes; other things it makes alongside come for free.
+Of several projects making an item the cheapest one counts, by money, then hours.
+
+Disassembly and the like make production go in circles; items are
+settled cheapest first, then made cheaper where a bulk project allows,
+see Recipes. Loops nothing gets into are reported as cycles.
+"""
+
+import sys, argparse, contextlib, collections, heapq
+import modloader, resgraph
+
+# money and engineer hours per unit, { raw item: count }, the project used or None for raw items
+Closure = collections.namedtuple('Closure', 'money hours raw project')
+
+def _produced(project):
+    return project.get('producedItems', { project['name']: 1 })
+
+class Recipes(object):
+    """ Closures of everything, settled cheapest first as in Dijkstra's:
+        a project becomes usable once all its inputs are settled, and offers
+        its outputs at their cost through it; the cheapest offer for an item
+        settles it. So each closure is computed once per project, and a project
+        that needs its own output, directly or around a loop, is never used
+        for it: the output is settled before the project becomes usable.
+
+        That alone assumes an output never costs less than its inputs, which
+        producedItems counts above 1 break: X made 100 at a time out of one
+        Y worth 100 costs 1, less than the Y it gets settled after. So once
+        everything is settled, cheaper offers get relaxed in as in Bellman-Ford,
+        and passed on to whatever is made from them, for at most as many rounds
+        as there are projects; items still getting cheaper then, going around
+        a loop that multiplies something, are in .unstable.
+
+        Items that only loops produce never settle; they count as raw,
+        and their loops are in .cycles.
+    """
+    def __init__(self, ruleset):
+        self.items = dict((i['type'], i) for i in ruleset.get('items', ()))
+        self.projects = list(ruleset.get('manufacture', ()))
+        self.producers = collections.defaultdict(list) # item -> projects producing it
+        for project in self.projects:
+            for item, count in _produced(project).items():
+                if count > 0:
+                    self.producers[item].append(project)
+        self.memo = {}
+        self.unstable = []
+        self.settle()
+        self.relax()
+        self.stuck = [item for item in self.producers if item not in self.memo]
+        self.cycles = [scc for scc in resgraph.cycles(self.edges()) if any(item in self.stuck for item in scc)]
+
+    def edges(self):
+        """ item -> items it's made from, with any project """
+        rv = {}
+        for item, projects in self.producers.items():
+            rv[item] = [i for project in projects for i in project.get('requiredItems', {})]
+        return rv
+
+    def offer(self, project, item):
+        """ Closure of one unit of item through the project, all its inputs being settled """
+        count = _produced(project)[item]
+        money = project.get('cost', 0)
+        hours = project.get('time', 0)
+        raw = collections.Counter()
+        for input_item, n in project.get('requiredItems', {}).items():
+            sub = self.memo[input_item]
+            money += n * sub.money
+            hours += n * sub.hours
+            for r, rn in sub.raw.items():
+                raw[r] += n * rn
+        if count != 1:
+            money, hours = money / count, hours / count
+            raw = collections.Counter(dict((r, rn / count) for r, rn in raw.items()))
+        return Closure(money, hours, raw, project['name'])
+
+    def settle(self):
+        users = collections.defaultdict(list) # item -> indices of projects needing it
+        waiting = []                          # per project, inputs not settled yet
+        heap = []
+        seq = 0
+        for n, project in enumerate(self.projects):
+            inputs = set(project.get('requiredItems', {}))
+            waiting.append(len(inputs))
+            for item in inputs:
+                users[item].append(n)
+                if item not in self.producers:
+                    self.memo[item] = Closure(0, 0, collections.Counter({ item: 1 }), None)
+        ready = [n for n, w in enumerate(waiting) if w == 0]
+        for item in list(self.memo):
+            for n in users[item]:
+                waiting[n] -= 1
+                if waiting[n] == 0:
+                    ready.append(n)
+        while True:
+            for n in ready:
+                for item, count in _produced(self.projects[n]).items():
+                    if count > 0 and item not in self.memo:
+                        c = self.offer(self.projects[n], item)
+                        heapq.heappush(heap, (c.money, c.hours, seq, item, c))
+                        seq += 1
+            ready = []
+            while heap:
+                money, hours, s, item, c = heapq.heappop(heap)
+                if item not in self.memo:
+                    break
+            else:
+                return
+            self.memo[item] = c
+            for n in users.get(item, ()):
+                waiting[n] -= 1
+                if waiting[n] == 0:
+                    ready.append(n)
+
+    def relax(self):
+        users = collections.defaultdict(list) # item -> projects needing it
+        for project in self.projects:
+            for item in project.get('requiredItems', {}):
+                users[item].append(project)
+        usable = lambda project: all(item in self.memo for item in project.get('requiredItems', {}))
+        todo = [project for project in self.projects if usable(project)]
+        changed = set()
+        for i in range(len(self.projects)):
+            changed = set()
+            for project in todo:
+                for item, count in _produced(project).items():
+                    if count > 0 and item in self.memo:
+                        c = self.offer(project, item)
+                        old = self.memo[item]
+                        if (c.money, c.hours) < (old.money, old.hours):
+                            self.memo[item] = c
+                            changed.add(item)
+            if len(changed) == 0:
+                return
+            todo = [project for project in self.projects if usable(project)
+                        and any(item in changed for item in project.get('requiredItems', {}))]
+        self.unstable = sorted(changed)
+
+    def closure(self, item):
+        """ Closure for one unit of the item """
+        rv = self.memo.get(item)
+        if rv is None:
+            rv = self.memo[item] = Closure(0, 0, collections.Counter({ item: 1 }), None)
+        return rv
+
+    def all(self):
+        """ { item: Closure } for everything some project makes """
+        return dict((item, self.closure(item)) for item in self.producers)
+
+    def buy_value(self, closure):
+        """ what the raw materials would cost to buy, and the ones that can't be bought """
+        value = 0
+        unbuyable = []
+        for item, n in closure.raw.items():
+            price = self.items.get(item, {}).get('costBuy', 0)
+            if price > 0:
+                value += n * price
+            else:
+                unbuyable.append(item)
+        return value, unbuyable
+
+def _num(v):
+    return "{:,.0f}".format(v) if v == int(v) else "{:,.2f}".format(v)
+
+def main(argv = None):
+    pa = argparse.ArgumentParser("modloader.py costs", description = "full manufacture costs of items")
+    pa.add_argument("root", help = "oxc root or a ruleset written by modloader.py -o")
+    pa.add_argument("items", nargs = '*', help = "items to detail; all of them in a table if none")
+    pa.add_argument("--cycles", "-c", action = "store_true", help = "list production loops nothing gets into")
+    pa.add_argument("--top", "-n", type = int, default = 0, help = "only the N most expensive")
+    args = pa.parse_args(argv)
+
+    modloader.STRICT.do_raise(False)
+    with contextlib.redirect_stdout(sys.stderr):
+        ruleset = modloader.load_ruleset(args.root)
+    recipes = Recipes(ruleset)
+
+    if args.cycles:
+        for scc in recipes.cycles:
+            print("cycle: {}".format(', '.join(sorted(scc))))
+        for item in sorted(recipes.stuck):
+            print("  only made in a loop, counted as raw: {}".format(item))
+        for item in recipes.unstable:
+            print("  still getting cheaper around a loop, cost not final: {}".format(item))
+
+    if args.items:
+        for item in args.items:
+            c = recipes.closure(item)
+            value, unbuyable = recipes.buy_value(c)
+            print("{}: via {}".format(item, c.project or "nothing, it's raw"))
+            print("  money {}  engineer hours {}  raw materials worth {}".format(_num(c.money), _num(c.hours), _num(value)))
+            for r, n in sorted(c.raw.items()):
+                print("    {:>10} {}{}".format(_num(n), r, " (can't be bought)" if r in unbuyable else ''))
+    elif not args.cycles:
+        closures = sorted(recipes.all().items(), key = lambda kv: (-kv[1].money, kv[0]))
+        if args.top > 0:
+            closures = closures[:args.top]
+        print("{:40} {:>14} {:>10} {:>5}  {}".format('item', 'money', 'hours', 'raw', 'project'))
+        for item, c in closures:
+            print("{:40} {:>14} {:>10} {:>5}  {}".format(item, _num(c.money), _num(c.hours), len(c.raw), c.project))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,7 +6,8 @@ import render2d
 from render2d import bufpal2surface, file2surface, chunkofsurface
 import fileformats
 
-from ruleset import ruleset
+import ruleclient
+ruleset = ruleclient.ruleset_module().ruleset # the modloader server if it's up, else ruleset.py
 
 DEG2RAD_MTP = math.pi / 180.0
 
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+"""
+Writes a fake openxcom installation for poking at modloader.py
+without the licensed game data.
+
+    fakeoxc.py /tmp/fake --mods 20 --files 10 --entities 200
+
+That gives options.cfg, a vanilla-shaped xcom1 master with zero-filled
+stub resources for everything load_vanilla() looks for, and the mods on top.
+Each mod's rule files define items, research, manufacture and so on;
+--overlap of the entities redefine ones from vanilla or earlier mods
+and --deletes of them are 'delete:' entries, so merge() has something
+to chew on. Same --seed, same tree.
+"""
+
+import os, argparse, random
+import yaml
+
+VANILLA_RESOURCES = """
+    GEODATA/INTERWIN.DAT GEODATA/SCANG.DAT GEODATA/LOFTEMPS.DAT GEODATA/PALETTES.DAT GEODATA/BACKPALS.DAT
+    GEOGRAPH/TEXTURE.DAT GEOGRAPH/BASEBITS.PCK GEOGRAPH/INTICON.PCK GEOGRAPH/BACK01.SCR
+    UFOGRAPH/SPICONS.DAT UFOGRAPH/CURSOR.PCK UFOGRAPH/SMOKE.PCK UFOGRAPH/HIT.PCK UFOGRAPH/X1.PCK
+    UFOGRAPH/MEDIBITS.DAT UFOGRAPH/DETBLOB.DAT UFOGRAPH/TAC00.SCR UFOGRAPH/MAN_0.SPK
+    UNITS/HANDOB.PCK
+    TERRAIN/CULTIVAT.MCD TERRAIN/CULTIVAT.PCK TERRAIN/CULTIVAT.TAB MAPS/CULTA00.MAP ROUTES/CULTA00.RMP
+""".split()
+
+# section: primary key; the sections each mod's rule files spread their entities over
+SECTIONS = (('items', 'type'), ('research', 'name'), ('manufacture', 'name'), ('armors', 'type'),
+            ('units', 'type'), ('facilities', 'type'), ('itemCategories', 'type'))
+
+class Generator(object):
+    def __init__(self, root, mods = 5, files = 5, entities = 50, overlap = 0.3, deletes = 0.02,
+                    vanilla = 200, languages = ('en-US', 'de'), seed = 0):
+        self.root = root
+        self.nmods = mods
+        self.nfiles = files
+        self.nentities = entities
+        self.overlap = overlap
+        self.deletes = deletes
+        self.nvanilla = vanilla
+        self.languages = languages
+        self.rng = random.Random(seed)
+        self.defined = dict((section, []) for section, pkey in SECTIONS)
+        self.nwritten = 0
+
+    def write(self, path, data = b'\0' * 16):
+        path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        with open(path, 'wb') as f:
+            f.write(data if type(data) is bytes else data.encode('utf-8'))
+        self.nwritten += 1
+
+    def dump(self, path, doc):
+        self.write(path, yaml.dump(doc, Dumper = getattr(yaml, 'CDumper', yaml.Dumper), allow_unicode = True))
+
+    def entity(self, section, name):
+        """ something shaped like the real thing, referring to things defined so far """
+        research = self.defined['research']
+        items = self.defined['items']
+        rv = {}
+        if section == 'items':
+            rv = { 'type': name, 'costBuy': self.rng.randint(1, 100000), 'weight': self.rng.randint(1, 30),
+                   'categories': self.rng.sample(self.defined['itemCategories'], min(2, len(self.defined['itemCategories']))) }
+            if research:
+                rv['requires'] = [self.rng.choice(research)]
+        elif section == 'research':
+            rv = { 'name': name, 'cost': self.rng.randint(10, 1000), 'points': self.rng.randint(1, 50) }
+            if research:
+                rv['dependencies'] = self.rng.sample(research, min(2, len(research)))
+        elif section == 'manufacture':
+            rv = { 'name': name, 'category': 'STR_EQUIPMENT', 'time': self.rng.randint(10, 500), 'cost': self.rng.randint(100, 10000),
+                   'requiresBaseFunc': ['WORKSHOP'] }
+            if items:
+                rv['requiredItems'] = dict((i, self.rng.randint(1, 5)) for i in self.rng.sample(items, min(3, len(items))))
+                rv['producedItems'] = { self.rng.choice(items): 1 }
+            if research:
+                rv['requires'] = [self.rng.choice(research)]
+        elif section == 'armors':
+            rv = { 'type': name, 'frontArmor': self.rng.randint(0, 100), 'spriteSheet': 'XCOM_0.PCK' }
+        elif section == 'units':
+            rv = { 'type': name, 'armor': self.rng.choice(self.defined['armors']) if self.defined['armors'] else 'STR_NONE_UC' }
+        elif section == 'facilities':
+            rv = { 'type': name, 'size': 1, 'provideBaseFunc': [self.rng.choice(('LAB', 'WORKSHOP', 'HANGAR'))] }
+        elif section == 'itemCategories':
+            rv = { 'type': name }
+        return rv
+
+    def vanilla(self):
+        for fname in VANILLA_RESOURCES:
+            self.write(os.path.join('UFO', fname))
+        self.dump('standard/xcom1/metadata.yml', { 'id': 'xcom1', 'name': 'UFO: Enemy Unknown', 'isMaster': True,
+            'master': '*', 'loadResources': ['UFO'], 'author': 'fakeoxc', 'description': 'vanilla-shaped master', 'version': '1.0' })
+        ruleset = {
+            'itemCategories': [], 'research': [], 'items': [], 'armors': [], 'units': [], 'manufacture': [],
+            'facilities': [{ 'type': 'STR_ACCESS_LIFT', 'size': 1, 'provideBaseFunc': ['LAB', 'WORKSHOP', 'HANGAR'] }],
+            'crafts': [{ 'type': 'STR_SKYRANGER' }],
+            'alienDeployments': [{ 'type': 'STR_TERROR_MISSION', 'unlockedResearch': 'STR_RESEARCH_0' }],
+            'terrains': [{ 'name': 'CULTA', 'mapDataSets': ['CULTIVAT'], 'mapBlocks': [{ 'name': 'CULTA00', 'width': 10, 'length': 10 }] }],
+            'ufos': [], 'MCDPatches': [],
+            'startingBase': { 'facilities': [{ 'type': 'STR_ACCESS_LIFT', 'x': 2, 'y': 2 }], 'items': {} },
+            'extraStrings': [] }
+        strings = {}
+        for section, pkey in SECTIONS:
+            n = self.nvanilla if section in ('items', 'research', 'manufacture') else max(1, self.nvanilla // 20)
+            for i in range(n):
+                name = 'STR_{}_{}'.format(section.upper(), i)
+                ruleset[section].append(self.entity(section, name))
+                self.defined[section].append(name)
+                strings[name] = "{} {}".format(section, i)
+        ruleset['startingBase']['items'] = dict((i, 1) for i in self.defined['items'][:10])
+        self.dump('standard/xcom1/Ruleset/vanilla.rul', ruleset)
+        for lang in self.languages:
+            self.dump('common/Language/{}.yml'.format(lang), { lang: strings })
+
+    def mod(self, index):
+        mid = 'fakemod{:03d}'.format(index)
+        self.dump('user/mods/{}/metadata.yml'.format(mid), { 'id': mid, 'name': mid, 'master': 'xcom1',
+            'author': 'fakeoxc', 'description': 'generated', 'version': '1.0' })
+        for fi in range(self.nfiles):
+            rul = {}
+            strings = {}
+            for n in range(self.nentities):
+                section, pkey = SECTIONS[self.rng.randrange(3) if self.rng.random() < 0.9 else self.rng.randrange(len(SECTIONS))]
+                existing = self.defined[section]
+                roll = self.rng.random()
+                if roll < self.deletes and len(existing) > 1:
+                    name = existing.pop(self.rng.randrange(len(existing)))
+                    rul.setdefault(section, []).append({ 'delete': name })
+                    continue
+                if roll < self.deletes + self.overlap and existing:
+                    name = self.rng.choice(existing)
+                else:
+                    name = 'STR_{}_{}_{}_{}'.format(mid.upper(), section.upper(), fi, n)
+                    existing.append(name)
+                    strings[name] = name.lower()
+                rul.setdefault(section, []).append(self.entity(section, name))
+            rul['extraStrings'] = [{ 'type': lang, 'strings': strings } for lang in self.languages]
+            self.dump('user/mods/{}/Ruleset/rules{:03d}.rul'.format(mid, fi), rul)
+        return mid
+
+    def generate(self):
+        self.vanilla()
+        mods = [{ 'id': 'xcom1', 'active': True }]
+        for i in range(self.nmods):
+            mods.append({ 'id': self.mod(i), 'active': True })
+        self.dump('user/options.cfg', { 'options': { 'language': self.languages[-1] }, 'mods': mods })
+        return self.nwritten
+
+def main(argv = None):
+    pa = argparse.ArgumentParser("fakeoxc.py", description = "write a fake openxcom installation with generated mods")
+    pa.add_argument("root", help = "where to write it; existing files get overwritten")
+    pa.add_argument("--mods", "-n", type = int, default = 5, help = "number of mods")
+    pa.add_argument("--files", "-m", type = int, default = 5, help = "rule files per mod")
+    pa.add_argument("--entities", "-k", type = int, default = 50, help = "entities per rule file")
+    pa.add_argument("--overlap", type = float, default = 0.3, help = "fraction of entities that redefine existing ones")
+    pa.add_argument("--deletes", type = float, default = 0.02, help = "fraction of entities that are deletes")
+    pa.add_argument("--vanilla", type = int, default = 200, help = "vanilla items/research/manufacture count")
+    pa.add_argument("--seed", type = int, default = 0)
+    args = pa.parse_args(argv)
+
+    gen = Generator(args.root, args.mods, args.files, args.entities, args.overlap, args.deletes, args.vanilla, seed = args.seed)
+    print("wrote {} files to {}".format(gen.generate(), args.root))
+
+if __name__ == '__main__':
+    main()
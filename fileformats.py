@@ -8,11 +8,12 @@
 
 import struct, pprint ,io
 import collections, copy
+import zipfs
 from recordclass import recordclass
 
 def load_world_dat(planet_dat):
     "http://www.ufopaedia.org/index.php/WORLD.DAT"
-    dat = open(planet_dat, "rb").read()
+    dat = zipfs.read(planet_dat)
     dat_t = struct.Struct('<hhhhhhhhhh')
     rv = []
     # 8
@@ -27,7 +28,7 @@ def load_palette(ruleset, palname):
     " http://www.ufopaedia.org/index.php/PALETTES.DAT "
     pmeta = ruleset['_palettes'][palname]
     rgb_t = struct.Struct('BBB')
-    paldata = open(pmeta['file'], 'rb').read()[pmeta['offs']:pmeta['offs']+pmeta['size']]
+    paldata = zipfs.read(pmeta['file'])[pmeta['offs']:pmeta['offs']+pmeta['size']]
 
     pal = []
     iu = rgb_t.iter_unpack(paldata)
@@ -90,7 +91,7 @@ def load_texture_dat(texture_dat, subX, subY):
     """
     lodlevels = 3
     reclen = subX * subY
-    data = open(texture_dat, 'rb').read()
+    data = zipfs.read(texture_dat)
     tex_in_lod = (len(data)//reclen)//lodlevels
 
     rv = []
@@ -155,11 +156,11 @@ def load_pck(pck_path, tab_path, tab_type = 2, w = 32):
     elif tab_type == 4:
         tab_type = struct.Struct("<I")
     if tab_path is not None:
-        tab_data = list(tab_type.iter_unpack(open(tab_path, 'rb').read()))
+        tab_data = list(tab_type.iter_unpack(zipfs.read(tab_path)))
     else:
         tab_data = [0]
     rv = []
-    pck_data = open(pck_path, 'rb').read()
+    pck_data = zipfs.read(pck_path)
     tab_data.append(len(pck_data))
     for pck_start, pck_end in zip(tab_data[::2], tab_data[1::2]):
         rle_data = pck_data[pck_start:pck_end]
@@ -182,7 +183,7 @@ def load_pck(pck_path, tab_path, tab_type = 2, w = 32):
 MapRec = collections.namedtuple('MapRec', 'floor west north ob')
 MapStruct = collections.namedtuple('MapStruct', 'cells height width depth')
 def load_map(map_path):
-    map_data = open(map_path, 'rb').read()
+    map_data = zipfs.read(map_path)
     eb = (len(map_data) - 3) % 4
     if eb > 0:
         #print("{}: {} extra bytes".format(map_path, eb))
@@ -228,7 +229,7 @@ def load_mcd(mcd_path, mcd_patch, mcd_offset):
             mcdp[p['MCDIndex']] = dict(((MCDPatchMap[k], v) for k, v in cp.items()))
     mcdi = 0
     rv = []
-    for mcd in (MCDRec(None, *i) for i in MCDStruct.iter_unpack(open(mcd_path, 'rb').read())):
+    for mcd in (MCDRec(None, *i) for i in MCDStruct.iter_unpack(zipfs.read(mcd_path))):
         mcd.Frame = struct.unpack("8B", mcd.Frame)
         mcd.LOFT = struct.unpack("12B", mcd.LOFT)
         mcd.origin = "{}:{}".format(mcd_path, mcdi)
@@ -245,7 +246,7 @@ class RouteRec(object):
         self.links = list(struct.iter_unpack('BBB', data[3:-5]))
 
 def load_rmp(rmp_path):
-    rmp_data = open(rmp_path, 'rb').read()
+    rmp_data = zipfs.read(rmp_path)
     rv = []
     for i in range(len(rmp_data)/24):
         rv.append(RouteRec(rmp_data[i*24:(i+1)*24-1]))
@@ -39,10 +39,15 @@ def merge_lang(lang, path):
             if strset['type'] == 'en-US':
                 lang.update(strset['strings'])
 
-lang = {}
-merge_lang(lang, 'common/Language/en-US.yml')
-merge_lang(lang, 'standard/xcom1/Language/en-US.yml')
-merge_lang(lang, 'user/mods/Piratez/Language/en-US.yml')
+import ruleclient
+client = ruleclient.connect()
+if client is not None: # modloader --serve is up, it has everything merged already
+    lang = client.strings(FALLBACK_LANG)
+else:
+    lang = {}
+    merge_lang(lang, 'common/Language/en-US.yml')
+    merge_lang(lang, 'standard/xcom1/Language/en-US.yml')
+    merge_lang(lang, 'user/mods/Piratez/Language/en-US.yml')
 
 
 if os.path.isdir(sys.argv[1]):
@@ -1,8 +1,8 @@
 #!/usr/bin/env python3
 
-import sys, time
+import os, sys, time
 from modloader import load_ruleset, list_to_dict
-import fileformats
+import fileformats, ruleclient
 
 import pprint
 
@@ -38,7 +38,11 @@ def missing_mdfs(terrain):
 
 def main():
     st = time.time()
-    ruleset = load_ruleset(sys.argv[1])
+    ruleset = None
+    if os.path.isdir(sys.argv[1]):
+        ruleset = ruleclient.connect(ruleclient.socket_path(sys.argv[1]))
+    if ruleset is None:
+        ruleset = load_ruleset(sys.argv[1])
     print("Ruleset loaded in {:.1f} s".format(time.time() - st))
 
     mcdpatches = list_to_dict('type', ruleset["MCDPatches"])
@@ -30,13 +30,26 @@ Please note that this script expects the openxcom configuration (options.cfg) in
 
 """
 
-import math, pprint, sys, os, copy, fnmatch, textwrap, pickle, argparse, traceback
-import importlib.util
+import math, pprint, sys, os, copy, fnmatch, textwrap, pickle, argparse, traceback, hashlib, time, json
+import importlib.util, concurrent.futures, zipfile, socket, selectors, struct, mmap, collections.abc, logging, sqlite3
 import yaml, msgpack
+import zipfs, ruleclient
+try:
+    import resource
+except ImportError: # windows
+    resource = None
 
 FALLBACK_LANG = 'en-US'
+# bump when what load() produces changes shape; read_ruleset() rejects anything else
+RULESET_SCHEMA = 1
+# bump when the writers' output changes for the same input, see Manifest
+OUTPUT_FORMAT = 2
+CACHE_DIRNAME = ruleclient.CACHE_DIRNAME # under the userdir of the installation
 TODO=False
 
+# per entity and per file chatter; main() turns it up with -v/-vv
+LOG = logging.getLogger('modloader')
+
 class Strict(object):
     def __init__(self, do_raise=True):
         self._do_raise = do_raise
@@ -66,8 +79,332 @@ class Strict(object):
 
 STRICT = Strict()
 
+class Profile(object):
+    """ Wall time, cpu time and peak rss per load phase, for --profile.
+
+        with PROFILE.phase('merge', mod.id):
+            ...
+        Repeated phases (per rule file, per key) accumulate into one record per phase and mod.
+        cpu includes reaped child processes, i.e. the --jobs parsers. Peak rss is
+        the process' high water mark as of the end of the phase, in KiB.
+    """
+    class _Phase(object):
+        def __init__(self, profile, name, mod):
+            self.profile, self.name, self.mod = profile, name, mod
+
+        def __enter__(self):
+            self.wall, self.cpu = time.perf_counter(), self.profile.cpu_time()
+
+        def __exit__(self, *exc):
+            self.profile.account(self.name, self.mod, time.perf_counter() - self.wall, self.profile.cpu_time() - self.cpu)
+
+    class _Nothing(object):
+        def __enter__(self):
+            pass
+
+        def __exit__(self, *exc):
+            pass
+
+    def __init__(self):
+        self.enabled = False
+        self.nothing = self._Nothing()
+        self.reset()
+
+    def enable(self):
+        self.enabled = True
+
+    def reset(self):
+        self.phases = {}
+        self.started = time.perf_counter()
+
+    def phase(self, name, mod=None):
+        return self._Phase(self, name, mod) if self.enabled else self.nothing
+
+    @staticmethod
+    def cpu_time():
+        if resource is None:
+            return time.process_time()
+        rv = 0
+        for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+            ru = resource.getrusage(who)
+            rv += ru.ru_utime + ru.ru_stime
+        return rv
+
+    @staticmethod
+    def peak_rss():
+        if resource is None:
+            return None
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss // 1024 if sys.platform == 'darwin' else rss # bytes there, KiB elsewhere
+
+    def account(self, name, mod, wall, cpu):
+        rec = self.phases.get((name, mod))
+        if rec is None:
+            rec = self.phases[(name, mod)] = { 'phase': name, 'mod': mod, 'calls': 0, 'wall': 0.0, 'cpu': 0.0 }
+        rec['calls'] += 1
+        rec['wall'] += wall
+        rec['cpu'] += cpu
+        rec['peak_rss_kb'] = self.peak_rss()
+
+    def dump(self, fname):
+        with open(fname, "w") as f:
+            json.dump({
+                'argv': sys.argv,
+                'wall': time.perf_counter() - self.started,
+                'peak_rss_kb': self.peak_rss(),
+                'phases': list(self.phases.values()) }, f, indent=1)
+        print("wrote profile to {}".format(fname))
+
+PROFILE = Profile()
+
+class MergeStats(object):
+    """ What each mod did to each section: entities added, modified and deleted,
+        files that touched the section and the time spent expanding and merging it.
+        Files read, bytes parsed and parse time are counted per mod, under section None.
+
+        Also where the last load resumed: mods from start on were merged, the ones before
+        came from the checkpoint keys[start - 1]. See IncrementalValidation.
+    """
+    FIELDS = ('files', 'bytes', 'added', 'modified', 'deleted', 'seconds')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.records = {} # (mod id, section) -> { field: count }
+        self.start = 0
+        self.keys = None
+
+    def record(self, mod, section = None):
+        rec = self.records.get((mod, section))
+        if rec is None:
+            rec = self.records[(mod, section)] = dict.fromkeys(self.FIELDS, 0)
+        return rec
+
+    def table(self, sections = False):
+        """ per mod totals, and each mod's sections under it if asked to """
+        mods = []
+        totals = {}
+        for (mod, section), rec in self.records.items():
+            if mod not in totals:
+                mods.append(mod)
+                totals[mod] = dict.fromkeys(self.FIELDS, 0)
+            for f in self.FIELDS:
+                if section is None or f not in ('files', 'bytes'): # those are already in the mod's own record
+                    totals[mod][f] += rec[f]
+        rows = [('mod/section',) + self.FIELDS]
+        def row(name, rec):
+            return (name, ) + tuple("{:.3f}".format(rec[f]) if f == 'seconds' else str(rec[f]) for f in self.FIELDS)
+        for mod in mods:
+            rows.append(row(mod, totals[mod]))
+            if sections:
+                for (m, section), rec in self.records.items():
+                    if m == mod and section is not None:
+                        rows.append(row('  ' + section, rec))
+        widths = [max(len(r[i]) for r in rows) for i in range(len(rows[0]))]
+        return "\n".join(' '.join(c.ljust(w) if i == 0 else c.rjust(w) for i, (c, w) in enumerate(zip(r, widths))) for r in rows)
+
+    def __str__(self):
+        return self.table(LOG.isEnabledFor(logging.INFO))
+
+MERGE_STATS = MergeStats()
+
+class ParseCache(object):
+    """ Persistent cache of yaml.load() results.
+
+        Each parsed file is stored as a pickle blob named after its absolute path.
+        The blob starts with a header of (size, mtime, sha1 of the content);
+        if size and mtime match, the document is used as is, if they don't but the content
+        hash does (touched, copied over), the header is refreshed. Otherwise the file is
+        re-parsed and the blob is rewritten.
+
+        Pickle rather than msgpack since it keeps int keys and yaml anchor aliasing intact,
+        so merge() sees exactly the same objects it would get from yaml.
+    """
+    VERSION = 1
+
+    def __init__(self, cachedir=None):
+        self.cachedir = None
+        self.hits = 0
+        self.misses = 0
+        # path -> (size, mtime, pickled doc); see remember()
+        self.memo = None
+        if cachedir is not None:
+            self.open(cachedir)
+
+    def remember(self):
+        """ also keep the documents in memory, for long-running processes """
+        if self.memo is None:
+            self.memo = {}
+
+    def open(self, cachedir):
+        os.makedirs(cachedir, exist_ok=True)
+        self.cachedir = cachedir
+
+    def close(self):
+        self.cachedir = None
+
+    def __str__(self):
+        return "yaml cache: {} hits, {} misses, dir={}".format(self.hits, self.misses, self.cachedir)
+
+    def _blobpath(self, path):
+        return os.path.join(self.cachedir, hashlib.sha1(os.path.abspath(path).encode()).hexdigest())
+
+    def _store(self, blobpath, header, doc):
+        tmppath = "{}.{}.tmp".format(blobpath, os.getpid())
+        with open(tmppath, "wb") as f:
+            pickle.dump(header, f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(doc, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmppath, blobpath)
+
+    def load(self, path):
+        if self.memo is not None:
+            st = zipfs.stat(path)
+            memo = self.memo.get(path)
+            if memo is not None and memo[:2] == (st.st_size, st.st_mtime_ns):
+                self.hits += 1
+                return pickle.loads(memo[2])
+            doc = self._load(path)
+            self.memo[path] = (st.st_size, st.st_mtime_ns, pickle.dumps(doc, pickle.HIGHEST_PROTOCOL))
+            return doc
+        return self._load(path)
+
+    def _load(self, path):
+        if self.cachedir is None:
+            self.misses += 1
+            return yaml.load(zipfs.open_file(path), Loader = yaml.CLoader)
+
+        st = zipfs.stat(path)
+        blobpath = self._blobpath(path)
+        header = None
+        try:
+            with open(blobpath, "rb") as f:
+                header = pickle.load(f)
+                if header[:3] == (self.VERSION, st.st_size, st.st_mtime_ns):
+                    self.hits += 1
+                    return pickle.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print("yaml cache: dropping broken blob for {}: {}".format(path, e))
+            header = None
+
+        data = zipfs.read(path)
+        digest = hashlib.sha1(data).hexdigest()
+        if header is not None and header[0] == self.VERSION and header[3] == digest:
+            with open(blobpath, "rb") as f:
+                pickle.load(f)
+                doc = pickle.load(f)
+            self.hits += 1
+            self._store(blobpath, (self.VERSION, st.st_size, st.st_mtime_ns, digest), doc)
+            return doc
+
+        self.misses += 1
+        doc = yaml.load(data, Loader = yaml.CLoader)
+        self._store(blobpath, (self.VERSION, st.st_size, st.st_mtime_ns, digest), doc)
+        return doc
+
+PARSE_CACHE = ParseCache()
+
 def yamload(path):
-    return yaml.load(open(path, "rb"), Loader = yaml.CLoader)
+    return PARSE_CACHE.load(path)
+
+def is_glob(pathglob):
+    return '?' in pathglob or '*' in pathglob or '[' in pathglob or pathglob.endswith('/')
+
+def split_upper(pathglob):
+    """ split the path into uppercase components """
+    components = []
+    remnant = pathglob.upper()
+    while remnant != '':
+        dirname, basename = os.path.split(remnant)
+        if basename == '': # pathglob ends in a slash: list entire dir
+            basename = '*'
+        components.insert(0, basename)
+        remnant = dirname
+    return components
+
+def _glob(pathglob, roots, listdir):
+    """ see Finder.glob(); listdir returns (name, NAME) pairs for a dir path """
+    components = split_upper(pathglob)
+
+    # about 5x speedup on xpiratez if we don't call fnmatch when not needed
+    if is_glob(pathglob):
+        def cmp(a, b):
+            return fnmatch.fnmatch(a, b)
+    else:
+        def cmp(a, b):
+            return a == b
+
+    # breadth-first search is simpler, but slower if we have
+    # all the stuff in the first root, plus a bunch of irrelevant
+    # roots after it.
+    candiroots = roots
+    nextroots = []
+    for pathcomp in components:
+        nextroots = []
+        for candiroot in candiroots:
+            for direntry, DIRENTRY in listdir(candiroot):
+                if cmp(DIRENTRY, pathcomp):
+                    nextroots.append(os.path.join(candiroot, direntry))
+        candiroots = nextroots
+
+    return nextroots
+
+class DirIndex(object):
+    """ Dir listings saved between runs.
+
+        Listings are os.scandir() based, so whether an entry is a dir comes from d_type
+        and costs no stat. A saved listing is reused while the dir's mtime stays the same.
+        Listings of dirs modified in the last couple of seconds are not saved,
+        since a change within the same mtime tick would go unnoticed.
+    """
+    VERSION = 1
+    SETTLE_NS = 2 * 10**9
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {} # dirpath -> (mtime_ns, [ (name, is_dir), ... ])
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        if path is not None:
+            try:
+                with open(path, "rb") as f:
+                    version, entries = pickle.load(f)
+                if version == self.VERSION:
+                    self.entries = entries
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print("dropping broken dir index {}: {}".format(path, e))
+
+    def __str__(self):
+        return "dir index: {} hits, {} misses, {} dirs".format(self.hits, self.misses, len(self.entries))
+
+    def scan(self, dirpath):
+        mtime = os.stat(dirpath).st_mtime_ns
+        entry = self.entries.get(dirpath)
+        if entry is not None and entry[0] == mtime:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        with os.scandir(dirpath) as it:
+            listing = [(de.name, de.is_dir()) for de in it]
+        if self.path is not None and time.time_ns() - mtime > self.SETTLE_NS:
+            self.entries[dirpath] = (mtime, listing)
+            self.dirty = True
+        return listing
+
+    def save(self):
+        if self.path is None or not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmppath = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(tmppath, "wb") as f:
+            pickle.dump((self.VERSION, self.entries), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmppath, self.path)
+        self.dirty = False
 
 class Finder(object):
     # This deals with paths, directories and their existence only.
@@ -80,7 +417,7 @@ class Finder(object):
     # and they might belong to completely different instances of OX/OXE/OXEM.
     # so we only use the first existing dir in the corresponding dirlists.
     #
-    def __init__(self, cfgdir=None, userdir = None, datadir = None, force = False):
+    def __init__(self, cfgdir=None, userdir = None, datadir = None, force = False, cachedir = None):
         # dirs are in order of importance, descending.
         self.datadirs = []
         self.userdirs = []
@@ -189,19 +526,60 @@ class Finder(object):
         self.config = yamload(self.cfgfile)
 
         self.dircache = {}
+        self.subdirs = set()
+        # where to keep checkpoints and such; None means don't.
+        self.cachedir = cachedir
+        self.dirindex = DirIndex(os.path.join(cachedir, 'dirindex') if cachedir is not None else None)
 
     def __str__(self):
         return "cfg={!r} user={!r} data={!r} cfgfile={}".format(self.cfgdir, self.userdir, self.datadir, self.cfgfile)
 
     def listdir(self, path):
-        """ cache os.listdir() and str.upper() calls"""
+        """ cache directory listings and str.upper() calls"""
         try:
             return self.dircache[path]
-        except:
-            dl = [(de, de.upper()) for de in os.listdir(path)]
+        except KeyError:
+            dl = []
+            if zipfs.locate(path)[0] is not None:
+                listing = zipfs.scandir(path)
+            else:
+                listing = self.dirindex.scan(path)
+            for de, is_dir in listing:
+                dl.append((de, de.upper()))
+                if is_dir:
+                    self.subdirs.add(os.path.join(path, de))
             self.dircache[path] = dl
             return dl
 
+    def isdir(self, path):
+        """ os.path.isdir(), but free for anything in an already listed dir """
+        if os.path.dirname(path) in self.dircache:
+            return path in self.subdirs
+        return zipfs.isdir(path)
+
+    def mount_zip(self, path):
+        """ mount a zipped mod, return its root: the archive itself, or its only top dir
+            if metadata.yml is not at the top.
+        """
+        zipfs.mount(path)
+        listing = self.listdir(path)
+        if 'METADATA.YML' in (DE for de, DE in listing):
+            return path
+        topdirs = [os.path.join(path, de) for de, DE in listing if self.isdir(os.path.join(path, de))]
+        if len(topdirs) == 1:
+            return topdirs[0]
+        return path
+
+    def save(self):
+        """ persist the dir index """
+        self.dirindex.save()
+
+    def refresh(self):
+        """ forget what was listed and re-read options.cfg; for long-running processes """
+        self.dircache = {}
+        self.subdirs = set()
+        self.config = yamload(self.cfgfile)
+
 
     """ Use cases:
 
@@ -228,38 +606,7 @@ class Finder(object):
             - fname: a partial filepath, possibly with fnmatch patterns in it
             - roots: a list of roots, absolute paths, from where to search
         """
-
-        # split the path into uppercase components
-        components = []
-        remnant = pathglob.upper()
-        while remnant != '':
-            dirname, basename = os.path.split(remnant)
-            if basename == '': # pathglob ends in a slash: list entire dir
-                basename = '*'
-            components.insert(0, basename)
-            remnant = dirname
-
-        # about 5x speedup on xpiratez if we don't call fnmatch when not needed
-        if '?' in pathglob or '*' in pathglob or '[' in pathglob or pathglob.endswith('/'):
-            def cmp(a, b):
-                return fnmatch.fnmatch(a, b)
-        else:
-            def cmp(a, b):
-                return a == b
-
-        # breadth-first search is simpler, but slower if we have
-        # all the stuff in the first root, plus a bunch of irrelevant
-        # roots after it.
-        candiroots = roots
-        for pathcomp in components:
-            nextroots = []
-            for candiroot in candiroots:
-                for direntry, DIRENTRY in self.listdir(candiroot):
-                    if cmp(DIRENTRY, pathcomp):
-                        nextroots.append(os.path.join(candiroot, direntry))
-            candiroots = nextroots
-
-        return nextroots
+        return _glob(pathglob, roots, self.listdir)
 
     def glob_data(self, pathglob):
         """ match explicitly againt datadirs: used for expanding extResDirs' paths """
@@ -276,20 +623,44 @@ class Finder(object):
     @property
     def modlist(self):
         def _dirlist(root, dirname):
-            for moddir in os.listdir(os.path.join(root, dirname)):
+            for moddir, MODDIR in self.listdir(os.path.join(root, dirname)):
                 modpath = os.path.join(root, dirname, moddir)
-                if os.path.isdir(modpath):
+                if self.isdir(modpath):
                     yield modpath
+                elif MODDIR.endswith('.ZIP'):
+                    try:
+                        yield self.mount_zip(modpath)
+                    except zipfile.BadZipFile as e:
+                        STRICT(e, "broken zip mod {}".format(modpath))
         for modpath in _dirlist(self.datadir, 'standard'):
             yield modpath
         for modpath in _dirlist(self.userdir, 'mods'):
             yield modpath
 
+def rules_mtime(modroot):
+    """ latest mtime of everything merged from a mod: the rul files in the root and Ruleset/,
+        and the Language/ files, plus the dirs themselves to catch added or removed files.
+
+        Resource files are not looked at; touch a rul file if those moved around.
+    """
+    mtime = 0
+    for subdir in ('', 'Ruleset', 'Language'):
+        dirpath = os.path.join(modroot, subdir)
+        if not zipfs.isdir(dirpath):
+            continue
+        mtime = max(mtime, zipfs.stat(dirpath).st_mtime)
+        for fname in zipfs.listdir(dirpath):
+            if fname.endswith(('.rul', '.yml')):
+                mtime = max(mtime, zipfs.stat(os.path.join(dirpath, fname)).st_mtime)
+    return mtime
+
 class ModMeta(object):
     """ mod metadata container plus a couple helper functions """
     def __init__(self, path, finder):
         self.root = path
         self.name = os.path.basename(path)
+        if self.name.lower().endswith('.zip'):
+            self.name = self.name[:-4]
         self.id = self.name
         self.author = "unknown author"
         self.description = "No description"
@@ -301,6 +672,7 @@ class ModMeta(object):
         self.version = "1.0"
         self.mtime = 0
         self.extResDirs = []
+        self.overlay = None
 
         for md in finder.config.get("mods", []):
             if md['id'] == self.id:
@@ -336,10 +708,15 @@ class ModMeta(object):
         self.extResDirs = erds
 
     def _bump_mtime(self, path):
-        mt = os.stat(path).st_mtime
+        mt = zipfs.stat(path).st_mtime
         if mt > self.mtime:
             self.mtime = mt
 
+    def scan_mtime(self):
+        """ bump mtime over everything merged from this mod, see rules_mtime() """
+        self.mtime = max(self.mtime, rules_mtime(self.root))
+        return self.mtime
+
     def __str__(self):
         return "id='{}' master='{}' name='{}' version='{}' root='{}' erd={}".format(
             self.id, self.masterID, self.name, self.version, self.root, self.extResDirs)
@@ -362,6 +739,8 @@ class ModMeta(object):
         }
 
     def findall(self, pathglob):
+        if self.overlay is not None:
+            return self.overlay.findall(self, pathglob)
         self_list = self.finder.glob(pathglob, [self.root])
         if len(self_list) > 0:
             return self_list
@@ -381,6 +760,77 @@ class ModMeta(object):
         except IndexError:
             raise FileNotFoundError("finder=({}) mod_root={} pathglob={}".format(self.finder, self.root, pathglob))
 
+class OverlayLayer(object):
+    """ Everything under a set of roots, listed once.
+
+        paths maps upper-cased relative paths to the real paths, in the same
+        order Finder.glob() would return them; listings keep the dir listings
+        for globbing.
+    """
+    def __init__(self, finder, roots):
+        self.roots = roots
+        self.listings = {}
+        self.paths = {}
+        level = [(root, '') for root in roots if zipfs.isdir(root)]
+        while len(level) > 0:
+            nextlevel = []
+            for dirpath, RELPATH in level:
+                listing = finder.listdir(dirpath)
+                self.listings[dirpath] = listing
+                for direntry, DIRENTRY in listing:
+                    path = os.path.join(dirpath, direntry)
+                    PATH = DIRENTRY if RELPATH == '' else RELPATH + '/' + DIRENTRY
+                    self.paths.setdefault(PATH, []).append(path)
+                    if finder.isdir(path):
+                        nextlevel.append((path, PATH))
+            level = nextlevel
+
+    def findall(self, pathglob):
+        if is_glob(pathglob):
+            return _glob(pathglob, self.roots, lambda path: self.listings.get(path, ()))
+        return self.paths.get('/'.join(split_upper(pathglob)), [])
+
+class Overlay(object):
+    """ Resolves mod paths for a whole load order.
+
+        A mod sees its own root, then its extResDirs plus 'common', then whatever its master sees,
+        and the first layer that has anything wins (see ModMeta.findall()). Here each layer
+        is an OverlayLayer, built once and shared between mods, and every lookup is memoized,
+        misses included, so expand_map_paths() & co don't walk the directories again and again.
+    """
+    def __init__(self, finder):
+        self.finder = finder
+        self.layers = {}
+        self.chains = {}
+        self.found = {}
+
+    def layer(self, roots):
+        roots = tuple(roots)
+        if roots not in self.layers:
+            self.layers[roots] = OverlayLayer(self.finder, roots)
+        return self.layers[roots]
+
+    def chain(self, mod):
+        if mod.id not in self.chains:
+            chain = [self.layer([mod.root])]
+            if len(mod.extResDirs) > 0:
+                chain.append(self.layer(os.path.join(self.finder.datadir, erd) for erd in mod.extResDirs + ['common']))
+            if mod.master is not None:
+                chain += self.chain(mod.master)
+            self.chains[mod.id] = chain
+        return self.chains[mod.id]
+
+    def findall(self, mod, pathglob):
+        key = (mod.id, pathglob)
+        if key not in self.found:
+            found = []
+            for layer in self.chain(mod):
+                found = layer.findall(pathglob)
+                if len(found) > 0:
+                    break
+            self.found[key] = found
+        return list(self.found[key])
+
 class ConstraintViolation(Exception):
     pass
 
@@ -408,10 +858,10 @@ def merge_extrastrings(mod_idx, left, right):
     for lang in rdict.keys():
         if lang in ldict.keys():
             ldict[lang]['strings'].update(rdict[lang]['strings'])
-            print("extraStrings: updated", lang)
+            LOG.debug("extraStrings: updated %s", lang)
         else:
             ldict[lang] = { 'type': lang, 'strings': rdict[lang]['strings'] }
-            print("extraStrings: added", lang)
+            LOG.debug("extraStrings: added %s", lang)
 
     return list(ldict.values())
 
@@ -456,23 +906,32 @@ def merge_extrasprites(mod_idx, left, right):
     return left
 
 def merge_extrasounds(mod_idx, left, right):
-    print(" merge_extrasounds(): skipping")
+    LOG.info(" merge_extrasounds(): skipping")
     return left
 
 def merge_globe(mod_idx, left, right):
     left.update(right)
     return left
 
-def merge(mod_idx, primarykey, left, right, show_diff_for = []):
+def merge(mod_idx, primarykey, left, right, show_diff_for = [], counts = None):
     """ drop stuff from left that is marked for deletion in right
         then replace/update the rest according to the primarykey
 
-        return the values() instead of hash. eww.
+        keyed collections stay dicts for the duration of the load so every rule file
+        doesn't pay for list_to_dict() and back; left may still be a list,
+        but what's returned is the dict. see collections_to_lists().
 
         also if primarykey is none, just replace.
+
+        counts: a MergeStats record to count added/modified/deleted entities in;
+        sections that aren't keyed count as one entity.
     """
+    if counts is None:
+        counts = dict.fromkeys(MergeStats.FIELDS, 0)
+    if primarykey is None or callable(primarykey):
+        counts['modified' if left else 'added'] += 1
     if primarykey is None:
-        print("      overwrite all")
+        LOG.debug("      overwrite all")
         if type(right) is dict:
             right['_mod_index'] = mod_idx
         elif type(right) is list:
@@ -482,7 +941,7 @@ def merge(mod_idx, primarykey, left, right, show_diff_for = []):
         return right
     elif callable(primarykey):
         return primarykey(mod_idx, left, right)
-    left_dict = list_to_dict(primarykey, left)
+    left_dict = left if type(left) is dict else list_to_dict(primarykey, left)
     deleted = []
     for item in right:
         if 'delete' in item:
@@ -490,7 +949,8 @@ def merge(mod_idx, primarykey, left, right, show_diff_for = []):
             assert len(item) == 1
             try:
                 del left_dict[item['delete']]
-                print("      del", item['delete'])
+                counts['deleted'] += 1
+                LOG.debug("      del %s", item['delete'])
             except KeyError as e:
                 STRICT(e, "      del {}: missing item".format(item['delete']))
 
@@ -502,7 +962,8 @@ def merge(mod_idx, primarykey, left, right, show_diff_for = []):
                 STRICT(e, "missing primarykey of '{}' in\n{}".format(primarykey, item))
                 continue
             if itype in left_dict:
-                print("      mod", itype)
+                counts['modified'] += 1
+                LOG.debug("      mod %s", itype)
                 if itype in show_diff_for:
                     print("original: {}\n\n".format(pprint.pformat(left_dict[itype])))
                     print("update:   {}\n\n".format(pprint.pformat(item)))
@@ -511,11 +972,19 @@ def merge(mod_idx, primarykey, left, right, show_diff_for = []):
                 else:
                     left_dict[itype].update(item)
             else:
+                counts['added'] += 1
                 if itype in deleted:
-                    print("      add", itype)
+                    LOG.debug("      add %s", itype)
                 left_dict[itype] = item
             left_dict[itype]['_mod_index'] = mod_idx
-    return dict_to_list(primarykey, left_dict)
+    return left_dict
+
+def collections_to_lists(ruleset):
+    """ convert the keyed collections merge() keeps as dicts back into lists """
+    for k, primarykey in PRIMARY_KEYS.items():
+        if type(primarykey) is str and type(ruleset.get(k)) is dict:
+            ruleset[k] = dict_to_list(primarykey, ruleset[k])
+    return ruleset
 
 def expand_map_paths(mod, terradef):
     if 'mapBlocks' not in terradef:
@@ -765,33 +1234,88 @@ PRIMARY_KEYS = {
     'statStrings': None,
 }
 
-def yamdirload_and_merge(mod, ruleset, rul_dir, suffix = '.rul', printdiff = True):
-    for d in os.listdir(rul_dir):
-        if d.endswith(suffix):
-            rulpath = os.path.join(rul_dir, d)
-            print("  read ", rulpath)
-            rul = yamload(rulpath)
-            for k, v in rul.items():
-                v = expand_paths(mod, k, v)
-                if k in ruleset.keys():
-                    print("   *", k)
-                else:
-                    print("   +", k)
-                    if type(v) is dict:
-                        ruleset[k] = {}
-                    elif type(v) is list:
-                        ruleset[k] = []
-                    else:
-                        ruleset[k] = None
-                #if printdiff:
-                    #print("{}: merge '{}'".format(rulpath, k))
-                STRICT.set_context(rulpath, k)
-                ruleset[k] = merge(mod.index, PRIMARY_KEYS[k], ruleset[k], v)
-        elif False:
-            print("Ign", os.path.join(path, d))
+def rul_files(rul_dir, suffix = '.rul'):
+    """ rule files in a dir in the order they get merged """
+    return [os.path.join(rul_dir, d) for d in zipfs.listdir(rul_dir) if d.endswith(suffix)]
+
+def mod_rul_files(mod):
+    """ all rule files of a mod in the order load() merges them """
+    rv = rul_files(mod.root)
+    rul_dir = os.path.join(mod.root, 'Ruleset')
+    if zipfs.isdir(rul_dir):
+        rv += rul_files(rul_dir)
+    return rv
+
+def _parse_worker_init(cachedir):
+    # a forked worker has the parent's archives, whose file offset it would share; spawned ones have none.
+    # Either way each worker gets its own, mounted as it comes across them.
+    zipfs.unmount_all()
+    if cachedir is not None:
+        PARSE_CACHE.open(cachedir)
+
+def _parse_worker(path):
+    hits, misses = PARSE_CACHE.hits, PARSE_CACHE.misses
+    doc = yamload(path)
+    return doc, PARSE_CACHE.hits - hits, PARSE_CACHE.misses - misses
+
+def parse_all(paths, jobs):
+    """ yamload() a bunch of files in a process pool.
+
+        Parsing is independent per file, so only this is parallel;
+        the merge stays serial in the load order. Returns { path: doc }.
+    """
+    print("parsing {} files in {} processes".format(len(paths), jobs))
+    with concurrent.futures.ProcessPoolExecutor(jobs,
+            initializer = _parse_worker_init, initargs = (PARSE_CACHE.cachedir,)) as pool:
+        rv = {}
+        chunksize = max(1, len(paths) // (jobs * 4))
+        for path, (doc, hits, misses) in zip(paths, pool.map(_parse_worker, paths, chunksize = chunksize)):
+            PARSE_CACHE.hits += hits
+            PARSE_CACHE.misses += misses
+            rv[path] = doc
+    return rv
 
+def yamdirload_and_merge(mod, ruleset, rul_dir, suffix = '.rul', printdiff = True, parsed = None, languages = None):
+    """ merge rule files from rul_dir into the ruleset.
 
-def load_vanilla(mod):
+        parsed: { path: doc } of already parsed files, see parse_all()
+        languages: extraStrings to keep, all if None
+    """
+    modstats = MERGE_STATS.record(mod.id)
+    for rulpath in rul_files(rul_dir, suffix):
+        LOG.info("  read  %s", rulpath)
+        st = time.perf_counter()
+        with PROFILE.phase('parse', mod.id):
+            rul = parsed.pop(rulpath) if parsed and rulpath in parsed else yamload(rulpath)
+        modstats['files'] += 1
+        modstats['bytes'] += zipfs.stat(rulpath).st_size
+        modstats['seconds'] += time.perf_counter() - st
+        for k, v in rul.items():
+            if k == 'extraStrings' and languages is not None:
+                v = [ess for ess in v if ess['type'] in languages]
+            st = time.perf_counter()
+            stats = MERGE_STATS.record(mod.id, k)
+            stats['files'] += 1
+            with PROFILE.phase('expand_paths', mod.id):
+                v = expand_paths(mod, k, v)
+            if k in ruleset.keys():
+                LOG.debug("   * %s", k)
+            else:
+                LOG.debug("   + %s", k)
+                if type(v) is dict or type(PRIMARY_KEYS.get(k)) is str:
+                    ruleset[k] = {}
+                elif type(v) is list:
+                    ruleset[k] = []
+                else:
+                    ruleset[k] = None
+            #if printdiff:
+                #print("{}: merge '{}'".format(rulpath, k))
+            STRICT.set_context(rulpath, k)
+            with PROFILE.phase('merge', mod.id):
+                ruleset[k] = merge(mod.index, PRIMARY_KEYS[k], ruleset[k], v, counts = stats)
+            stats['seconds'] += time.perf_counter() - st
+
+def load_vanilla(mod, languages = None):
     # Mod.cpp::loadVanillaResources()
     def fi(pathglob):
         return mod.findone(pathglob)
@@ -927,11 +1451,13 @@ def load_vanilla(mod):
 
     for fpath in mod.findall(os.path.join('Language', '*.yml')):
         fname = os.path.basename(fpath)
+        if languages is not None and os.path.splitext(fname)[0] not in languages:
+            continue
         translation = yamload(fpath)
-        print("Loading strings from {}".format(fpath))
+        LOG.info("Loading strings from %s", fpath)
         for lang, strings in translation.items():
             es = {'type': lang, 'strings': strings}
-            print("lang {} strings {} of {}".format(lang, type(strings), len(strings)))
+            LOG.debug("lang %s strings %s of %d", lang, type(strings), len(strings))
 
         if 'common' in fpath.lower():
             baseStrings.append(es)
@@ -942,7 +1468,75 @@ def load_vanilla(mod):
 
     return { 'extraSprites': surfaces, 'extraStrings': extraStrings, '_palettes': palettes }
 
-def load(finder):
+class Checkpoints(object):
+    """ Snapshots of the merged ruleset after some of the mods in the load order.
+
+        Each snapshot is the whole ruleset so far, so there's one after the master,
+        the last mod, and the 2nd, 4th, 8th... mod from the end, see wanted().
+        That writes about log2(mods) rulesets instead of one per mod, and an edit
+        to the d-th mod from the end re-merges under 2d mods.
+
+        A snapshot is keyed on the load order prefix up to and including the mod,
+        together with every mod's mtime in that prefix, so editing a mod invalidates
+        its own snapshot and everything after it, but not the ones before.
+
+        Snapshots also carry the STRICT errors collected while merging the prefix.
+
+        Without a cachedir they are kept in memory, as pickled bytes, since
+        merging mutates the restored ruleset.
+    """
+    VERSION = 2
+
+    def __init__(self, cachedir=None):
+        self.cachedir = cachedir
+        self.memo = {}
+        if cachedir is not None:
+            os.makedirs(cachedir, exist_ok=True)
+
+    def key(self, load_order, upto, languages = None):
+        prefix = [(mod.id, mod.root, mod.mtime) for mod in load_order[:upto + 1]]
+        languages = None if languages is None else sorted(languages)
+        return hashlib.sha1(repr((self.VERSION, prefix, languages)).encode()).hexdigest()
+
+    @staticmethod
+    def wanted(upto, count):
+        """ whether to snapshot after load_order[upto] of count mods """
+        from_end = count - upto
+        return upto == 0 or from_end & (from_end - 1) == 0
+
+    def restore(self, key):
+        if self.cachedir is None:
+            return pickle.loads(self.memo[key]) if key in self.memo else None
+        try:
+            with open(os.path.join(self.cachedir, key), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print("checkpoint {} is broken: {}".format(key, e))
+            return None
+
+    def save(self, key, ruleset, errors):
+        if self.cachedir is None:
+            self.memo[key] = pickle.dumps((ruleset, errors), pickle.HIGHEST_PROTOCOL)
+            return
+        path = os.path.join(self.cachedir, key)
+        tmppath = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmppath, "wb") as f:
+            pickle.dump((ruleset, errors), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmppath, path)
+
+    def prune(self, keep):
+        """ drop snapshots of load orders or mod states that are gone """
+        if self.cachedir is None:
+            self.memo = dict((key, self.memo[key]) for key in keep if key in self.memo)
+            return
+        for fname in os.listdir(self.cachedir):
+            if fname not in keep:
+                os.unlink(os.path.join(self.cachedir, fname))
+
+def resolve_load_order(finder):
+    """ figure out the active mods from options.cfg and return them in the order they are to be merged """
     present_mods = dict((mod.id, mod) for mod in [ ModMeta(p, finder) for p in finder.modlist ])
     """ Mod dependencies
 
@@ -1020,211 +1614,651 @@ def load(finder):
         mod_index += 1
         del active_mods[mod.id]
 
-    print("\nload_order:\n ", '\n  '.join(map(str, load_order)))
+    LOG.info("\nload_order:\n  %s", '\n  '.join(map(str, load_order)))
+    return load_order
 
-    ruleset = {}
+def wanted_languages(finder, all_languages = False):
+    """ the configured language and FALLBACK_LANG, or None for all of them """
+    if all_languages:
+        return None
+    return { finder.config.get('options', {}).get('language', FALLBACK_LANG), FALLBACK_LANG }
+
+def load(finder, jobs = 1, checkpoints = None, all_languages = False):
+    """ merge all active mods into one ruleset.
+
+        jobs: number of processes to parse rule files in
+        checkpoints: where to keep per-mod snapshots, by default under the finder's cachedir
+        all_languages: keep strings of every language, not just the ones wanted_languages() says
+    """
+    languages = wanted_languages(finder, all_languages)
+    with PROFILE.phase('mod scan'):
+        load_order = resolve_load_order(finder)
+
+    overlay = Overlay(finder)
     for mod in load_order:
-        print("\nLoading '{}' name='{}' '{}' from '{}'".format(mod.id,  mod.name, mod.version, mod.root))
+        mod.overlay = overlay
+
+    ruleset = {}
+    start = 0
+    errors_before = len(STRICT.errors)
+    MERGE_STATS.reset()
+    if checkpoints is None and finder.cachedir is not None:
+        checkpoints = Checkpoints(os.path.join(finder.cachedir, 'checkpoints'))
+    if checkpoints is not None:
+        with PROFILE.phase('checkpoint restore'):
+            for mod in load_order:
+                mod.scan_mtime()
+            keys = [checkpoints.key(load_order, i, languages) for i in range(len(load_order))]
+            for i in reversed(range(len(load_order))):
+                snapshot = checkpoints.restore(keys[i])
+                if snapshot is not None:
+                    ruleset, errors = snapshot
+                    STRICT.errors.extend(errors)
+                    start = i + 1
+                    print("\nResuming from the checkpoint after '{}'".format(load_order[i].id))
+                    break
+
+    if checkpoints is not None:
+        MERGE_STATS.start, MERGE_STATS.keys = start, keys
+
+    parsed = {}
+    if jobs > 1:
+        with PROFILE.phase('parse', '(all, {} jobs)'.format(jobs)):
+            parsed = parse_all([path for mod in load_order[start:] for path in mod_rul_files(mod)], jobs)
+
+    for mod in load_order[start:]:
+        LOG.info("\nLoading '%s' name='%s' '%s' from '%s'", mod.id,  mod.name, mod.version, mod.root)
         # the topmost master mod, one of xcom1 or xcom2 is:
         if mod.isMaster and mod.master is None:
             if mod.id not in ('xcom1', 'xcom2'):
                 raise Exception("masterless master mod {}".format(mod))
-            ruleset = load_vanilla(mod)
-        yamdirload_and_merge(mod, ruleset, mod.root)
+            with PROFILE.phase('load_vanilla', mod.id):
+                ruleset = load_vanilla(mod, languages)
+        yamdirload_and_merge(mod, ruleset, mod.root, parsed = parsed, languages = languages)
         rul_dir = os.path.join(mod.root, 'Ruleset')
-        if os.path.isdir(rul_dir):
-            yamdirload_and_merge(mod, ruleset, rul_dir)
+        if zipfs.isdir(rul_dir):
+            yamdirload_and_merge(mod, ruleset, rul_dir, parsed = parsed, languages = languages)
+        if checkpoints is not None and checkpoints.wanted(mod.index, len(load_order)):
+            with PROFILE.phase('checkpoint save', mod.id):
+                checkpoints.save(keys[mod.index], ruleset, STRICT.errors[errors_before:])
+
+    if checkpoints is not None:
+        checkpoints.prune(keys)
+
+    collections_to_lists(ruleset)
+    finder.save()
 
     ruleset['_mod_meta'] = []
     for mod in load_order:
         ruleset['_mod_meta'].append(mod.as_dict())
     ruleset['_config'] = finder.config
+    ruleset['_schema'] = RULESET_SCHEMA
+    if len(MERGE_STATS.records) > 0:
+        print("\nmerged:\n{}".format(MERGE_STATS))
     return ruleset
 
-def after_load_checks(ruleset):
-    defined_items = set(item['type'] for item in ruleset['items'])
-    defined_items.update(item['type'] for item in ruleset['crafts'])
-    defined_items.update(item['type'] for item in ruleset['units'])
-    #defined_item_names = set(item['name'] for item in ruleset['items'])
-    defined_research = set(item['name'] for item in ruleset['research'])
-    defined_categories = set(item['type'] for item in ruleset.get('itemCategories', {}))
-    defined_basefunc = set()
-    for facility in ruleset['facilities']:
-        if 'provideBaseFunc' in facility:
-            defined_basefunc.update(facility['provideBaseFunc'])
-    defined_armors = set(item['type'] for item in ruleset['armors'])
-    defined_research_lookups = set()
-    defined_free_researches = set()
-    for item in ruleset['research']:
-        gofp = set()
-        for k, v in item.get('getOneFreeProtected', {}).items():
-            gofp.update(set(v))
-        defined_free_researches.update(item.get('getOneFree', ()), gofp, item.get('sequentialGetOneFree', ()))
-        if 'lookup' in item:
-            defined_research_lookups.add(item['lookup'])
-
-    for item in ruleset['research']:
-        if 'lookup' in item:
-            defined_research_lookups.add(item['lookup'])
-
-    defined_mission_unlocked_researches = set()
-    for item in ruleset['alienDeployments']:
-        if 'unlockedResearch' in item:
-            defined_mission_unlocked_researches.add(item['unlockedResearch'])
-
-    def get_mod_name(item):
-        return ruleset['_mod_meta'][item['_mod_index']]['id']
-
-    def manufacture():
-        STRICT.set_context('after_load_checks', 'manufacture')
-        for item in ruleset['manufacture']:
-            item_name = item['name']
-            mod_name = get_mod_name(item)
-            reqd_research = set(item.get('requires', ()))
-            reqd_items = set(item.get('requiredItems', {}).keys())
-            reqd_basefunc = set(item.get('requiresBaseFunc', ()))
-            prod_items_counts = item.get('producedItems', { item['name']: 1 })
-            prod_items = set(prod_items_counts.keys())
-
-            # check we have everything needed
-
-            missing = reqd_research.difference(defined_research)
-            if len(missing) != 0:
-                STRICT(ConstraintViolation,
-                       "Required researchItem not defined for production {}/{}: {}".format(mod_name, item_name, str(missing)))
-
-            missing = reqd_items.difference(defined_items)
-            if len(missing) != 0:
-                STRICT(ConstraintViolation,
-                       "Required items not defined for production {}/{}: {}".format(mod_name, item_name, str(missing)))
-
-            missing = reqd_basefunc.difference(defined_basefunc)
-            if len(missing) != 0:
-                STRICT(ConstraintViolation,
-                       "Required base func not provided for production {}/{}: {}".format(mod_name, item_name, str(missing)))
-
-            missing = prod_items.difference(defined_items)
-            if len(missing) != 0:
-                STRICT(ConstraintViolation,
-                       "Produced items not defined for production {}/{}: {}".format(mod_name, item_name, str(missing)))
-
-            # check we're not producing more than one craft
-            if item['category'] == 'STR_CRAFT':
-                if prod_items_counts[item['name']] != 1:
-                    STRICT(ConstraintViolation,
-                        "Too many crafts built in production {}/{}".format(modname, item_name))
-
-    def research():
-        STRICT.set_context('after_load_checks', 'research')
-        for item in ruleset['research']:
-            item_name = item['name']
-            mod_name = get_mod_name(item)
-            dependencies = set(item.get('dependencies', ()))
-            unlocks = set(item.get('unlocks', ()))
-            disables = set(item.get('disables', ()))
-            requires = set(item.get('requires', ()))
-            getOneFree = set(item.get('getOneFree', ()))
-            getOneFreeProtected = set()
-            for k, v in item.get('getOneFreeProtected', {}).items():
-                getOneFreeProtected.add(k)
-                getOneFreeProtected.update(set(v))
-            reqd_basefunc = set(item.get('requiresBaseFunc', ()))
-            lookup = set((item['lookup'],)) if 'lookup' in item else set()
-            #= set(item[''])
-
-            # 1. lookup and item_name should be in ufopaedia
-            # 2. lookup is itself a research project
-            # 3. needItem=true means an item must be defined with the same name as the research topic
-            #    OR the research in question should be reachable by getOneFrees or a lookup
-            # 4. requires is a list of research topics
-            # 5. dependencies is a list of research topics
-            # 6. disables  is a list of research topics
-            # 7. getOneFree is a list of research topics
-            # 8. getOneFreeProtected is a map of lists of research topics keyed by research topics
-
-            reqd_research = requires.union(dependencies, unlocks, disables, requires, lookup,
-                                            getOneFree, getOneFreeProtected)
-            missing = reqd_research.difference(defined_research)
-            if len(missing) != 0:
-                STRICT(ConstraintViolation,
-                       "Referenced researchItem not defined for researchItem {}/{}: {}".format(mod_name, item_name, str(missing)))
-
-            missing = reqd_basefunc.difference(defined_basefunc)
-            if len(missing) != 0:
-                STRICT(ConstraintViolation,
-                       "Required base func not provided for researchItem {}/{}: {}".format(mod_name, item_name, str(missing)))
-
-            if not item.get('needItem', False):
-                continue
-            if item_name in defined_items:
-                continue
-            if item_name in defined_research_lookups:
-                continue
-            if item_name in defined_free_researches:
-                continue
-            if item_name in defined_mission_unlocked_researches: # successful mission sets this as finished, not unlocked
+# key sets the references are checked against. name: sources, where a source is either
+# (section, field) - the field's values of every entity in the section, see field_values() -
+# or the name of another key set to include
+KEYSETS = {
+    'items': (('items', 'type'), ('crafts', 'type'), ('units', 'type')),
+    'research': (('research', 'name'),),
+    'categories': (('itemCategories', 'type'),),
+    'basefunc': (('facilities', 'provideBaseFunc'),),
+    'armors': (('armors', 'type'),),
+    'alienDeployments': (('alienDeployments', 'type'),),
+    # needItem topics should be reachable by one of these
+    'research_reach': ('items', ('research', 'lookup'),
+                        ('research', 'getOneFree'), ('research', 'getOneFreeProtected.*'), ('research', 'sequentialGetOneFree'),
+                        ('alienDeployments', 'unlockedResearch')), # successful mission sets this as finished, not unlocked
+}
+
+def field_values(entity, field):
+    """ keys a field refers to: a string, a list of them or keys of a dict.
+        'field.*' is the values of a dict of lists instead, like getOneFreeProtected
+    """
+    if field.endswith('.*'):
+        rv = []
+        for v in entity.get(field[:-2], {}).values():
+            rv.extend(v if type(v) is list else (v,))
+        return rv
+    v = entity.get(field)
+    if v is None:
+        return ()
+    if type(v) is dict:
+        return v.keys()
+    if type(v) is list:
+        return v
+    return (v,)
+
+class Ref(object):
+    """ values of any of the fields of each entity in section must be keys in the keyset.
+
+        message gets the mod, the entity's name and what's missing; that's the value itself
+        for single string fields, a set otherwise.
+        when: only check entities this is true for
+        default: what the entity refers to when none of the fields are there
+        ignore: values that aren't references, like STR_NONE
+    """
+    def __init__(self, section, fields, keyset, message, when = None, default = None, ignore = ()):
+        self.section = section
+        self.fields = fields
+        self.keyset = keyset
+        self.message = message
+        self.when = when
+        self.default = default
+        self.ignore = frozenset(ignore)
+        # (field, is a dict of lists) pairs, so the check doesn't parse the names per entity
+        self._fields = [(f[:-2], True) if f.endswith('.*') else (f, False) for f in fields]
+
+    def refs(self, entity):
+        rv = set()
+        for field in self.fields:
+            rv.update(field_values(entity, field))
+        if len(rv) == 0 and self.default is not None:
+            rv.update(self.default(entity))
+        return rv
+
+    def refkeys(self, entity):
+        """ (keyset, key) for everything the entity refers to, whether it's there or not """
+        return [(self.keyset, key) for key in self.refs(entity)]
+
+    def missing(self, entity, keys):
+        """ what the entity refers to that's not in keys, or None. this runs for every
+            entity and rule, so it doesn't build sets unless something is missing """
+        rv = None
+        found = False
+        for field, of_lists in self._fields:
+            v = entity.get(field)
+            if v is None:
                 continue
-            STRICT(ConstraintViolation,
-                   "Unreachable researchItem: {}/{}: {}".format(mod_name, item_name, item_name))
-
-    def item():
-        STRICT.set_context('after_load_checks', 'item')
-        for item in ruleset['items']:
-            item_name = item['type'] # well, shit, item['name'] is also a thing as is nameAsAmmo
-            mod_name = get_mod_name(item)
-            reqd_research = set(item.get('requires', ()))
-            reqd_research.update(set(item.get('requiresBuy', ())))
-            reqd_basefunc = set(item.get('requiresBuyBaseFunc', ()))
-            categories = set(item.get('categories', ()))
-            ammo = set(item.get('compatibleAmmo', ()))
-
-            if item.get('fixedWeapon', False) and item_name not in defined_items:
-                STRICT(ConstraintViolation,
-                      "Required item/unit/craft not defined for fixedWeapon item: {}/{}: {}".format(mod_name, item_name, item_name))
-            missing = reqd_research.difference(defined_research)
-            if len(missing) != 0:
-                STRICT(ConstraintViolation,
-                       "Required researchItem not defined for {}/{}: {}".format(mod_name, item_name, str(missing)))
-
-            missing = reqd_basefunc.difference(defined_basefunc)
-            if len(missing) != 0:
-                STRICT(ConstraintViolation,
-                       "Required base func not provided for buying {}/{}: {}".format(mod_name, item_name, str(missing)))
-
-            missing = ammo.difference(defined_items)
-            if len(missing) != 0:
-                STRICT(ConstraintViolation,
-                       "Ammo items not defined for {}/{}: {}".format(mod_name, item_name, str(missing)))
-
-            missing = categories.difference(defined_categories)
-            if len(missing) != 0:
-                STRICT(ConstraintViolation,
-                       "Undefined item categories for {}/{}: {}".format(mod_name, item_name, str(missing)))
-
-    def unit():
-        STRICT.set_context('after_load_checks', 'unit')
-        for item in ruleset['units']:
-            item_name = item['type'] # well, shit, item['name'] is also a thing as is nameAsAmmo
-            mod_name = get_mod_name(item)
-            if item['armor'] not in defined_armors:
-                STRICT(ConstraintViolation,
-                       "Armor not defined for unit {}/{}: {}".format(mod_name, item_name, item['armor']))
-    manufacture()
-    research()
-    item()
-    unit()
-
-def load_ruleset(path):
-    """ load the ruleset from a self-contained installation and return it """
+            found = True
+            if of_lists:
+                v = [x for vs in v.values() for x in (vs if type(vs) is list else (vs,))]
+            elif type(v) is str:
+                v = (v,)
+            for x in v:
+                if x not in keys and x not in self.ignore:
+                    if rv is None:
+                        rv = set()
+                    rv.add(x)
+        if not found and self.default is not None:
+            rv = set(self.default(entity)).difference(keys, self.ignore) or None
+        return rv
+
+    def check(self, entity, keysets, mod, name):
+        if self.when is not None and not self.when(entity):
+            return
+        missing = self.missing(entity, keysets[self.keyset])
+        if missing is None:
+            return
+        value = entity.get(self.fields[0])
+        if len(self.fields) == 1 and type(value) is str:
+            missing = value
+        STRICT(ConstraintViolation, self.message.format(mod = mod, name = name, missing = missing))
+
+class Check(object):
+    """ anything else about an entity: test(entity) is true when it's wrong """
+    def __init__(self, section, test, message):
+        self.section = section
+        self.test = test
+        self.message = message
+
+    def refkeys(self, entity):
+        return ()
+
+    def check(self, entity, keysets, mod, name):
+        if self.test(entity):
+            STRICT(ConstraintViolation, self.message.format(mod = mod, name = name))
+
+VALIDATION = [
+    Ref('manufacture', ('requires',), 'research', "Required researchItem not defined for production {mod}/{name}: {missing}"),
+    Ref('manufacture', ('requiredItems',), 'items', "Required items not defined for production {mod}/{name}: {missing}"),
+    Ref('manufacture', ('requiresBaseFunc',), 'basefunc', "Required base func not provided for production {mod}/{name}: {missing}"),
+    Ref('manufacture', ('producedItems',), 'items', "Produced items not defined for production {mod}/{name}: {missing}",
+        default = lambda e: (e['name'],)),
+    Check('manufacture', lambda e: e.get('category') == 'STR_CRAFT' and e.get('producedItems', { e['name']: 1 }).get(e['name']) != 1,
+        "Too many crafts built in production {mod}/{name}"),
+
+    Ref('research', ('requires', 'dependencies', 'unlocks', 'disables', 'lookup',
+                     'getOneFree', 'getOneFreeProtected', 'getOneFreeProtected.*'), 'research',
+        "Referenced researchItem not defined for researchItem {mod}/{name}: {missing}"),
+    Ref('research', ('requiresBaseFunc',), 'basefunc', "Required base func not provided for researchItem {mod}/{name}: {missing}"),
+    Ref('research', ('name',), 'research_reach', "Unreachable researchItem: {mod}/{name}: {missing}",
+        when = lambda e: e.get('needItem', False)),
+
+    Ref('items', ('type',), 'items', "Required item/unit/craft not defined for fixedWeapon item: {mod}/{name}: {missing}",
+        when = lambda e: e.get('fixedWeapon', False)),
+    Ref('items', ('requires', 'requiresBuy'), 'research', "Required researchItem not defined for {mod}/{name}: {missing}"),
+    Ref('items', ('requiresBuyBaseFunc',), 'basefunc', "Required base func not provided for buying {mod}/{name}: {missing}"),
+    Ref('items', ('compatibleAmmo',), 'items', "Ammo items not defined for {mod}/{name}: {missing}"),
+    Ref('items', ('categories',), 'categories', "Undefined item categories for {mod}/{name}: {missing}"),
+
+    Ref('units', ('armor',), 'armors', "Armor not defined for unit {mod}/{name}: {missing}"),
+
+    Ref('armors', ('storeItem',), 'items', "Store item not defined for armor {mod}/{name}: {missing}", ignore = ('STR_NONE',)),
+    Ref('soldiers', ('armor',), 'armors', "Armor not defined for soldier {mod}/{name}: {missing}"),
+    Ref('soldiers', ('requires',), 'research', "Required researchItem not defined for soldier {mod}/{name}: {missing}"),
+    Ref('crafts', ('requires',), 'research', "Required researchItem not defined for craft {mod}/{name}: {missing}"),
+    Ref('crafts', ('refuelItem',), 'items', "Refuel item not defined for craft {mod}/{name}: {missing}"),
+    Ref('craftWeapons', ('launcher', 'clip'), 'items', "Launcher or clip item not defined for craft weapon {mod}/{name}: {missing}"),
+    Ref('facilities', ('requires',), 'research', "Required researchItem not defined for facility {mod}/{name}: {missing}"),
+    Ref('ufopaedia', ('requires',), 'research', "Required researchItem not defined for ufopaedia article {mod}/{name}: {missing}"),
+    Ref('alienDeployments', ('unlockedResearch',), 'research', "Unlocked researchItem not defined for deployment {mod}/{name}: {missing}"),
+    Ref('alienDeployments', ('nextStage',), 'alienDeployments', "Next stage not defined for deployment {mod}/{name}: {missing}"),
+]
+
+def build_keysets(ruleset, keysets = KEYSETS):
+    """ { keyset name: set of keys }, each built once """
+    rv = {}
+    def build(name):
+        if name not in rv:
+            keys = set()
+            for source in keysets[name]:
+                if type(source) is str:
+                    keys.update(build(source))
+                else:
+                    section, field = source
+                    for entity in ruleset.get(section, ()):
+                        keys.update(field_values(entity, field))
+            rv[name] = keys
+        return rv[name]
+    for name in keysets:
+        build(name)
+    return rv
+
+def rules_by_section(rules):
+    rv = {}
+    for rule in rules:
+        rv.setdefault(rule.section, []).append(rule)
+    return rv
+
+def validate(ruleset, rules = VALIDATION, keysets = KEYSETS):
+    """ check all the rules in one pass over each section they're about, report through STRICT """
+    keys = build_keysets(ruleset, keysets)
+    mod_meta = ruleset['_mod_meta']
+    for section, section_rules in rules_by_section(rules).items():
+        STRICT.set_context('after_load_checks', section)
+        pkey = PRIMARY_KEYS[section]
+        for entity in ruleset.get(section, ()):
+            mod = mod_meta[entity['_mod_index']]['id']
+            name = entity.get(pkey)
+            for rule in section_rules:
+                rule.check(entity, keys, mod, name)
+
+class IncrementalValidation(object):
+    """ validate() that only rechecks what changed since the last time.
+
+        An entity is rechecked if
+        - it is new, or was merged by a mod at or after MERGE_STATS.start either this time
+          or the last time: everything else came out of the same checkpoint both times
+          and wasn't touched since,
+        - or it refers to a key that was added to or dropped from a key set, found
+          through the reverse index of (keyset, key) -> { (section, name), ... }.
+        Everything else has its errors from the last time reported again, so STRICT
+        ends up with the same errors in the same order as validate() would give.
+
+        If the load didn't resume from the checkpoint the last time ended at, if the
+        rules changed, or if there is no last time, it's all rechecked.
+
+        State is kept in memory for --watch, and in a pickle at path if given.
+    """
+    VERSION = 1
+
+    def __init__(self, path = None, rules = VALIDATION, keysets = KEYSETS):
+        self.path = path
+        self.rules = rules
+        self.keysets = keysets
+        self.fingerprint = repr([(type(r).__name__, r.section, getattr(r, 'fields', None), getattr(r, 'keyset', None), r.message)
+                                    for r in rules] + sorted(keysets.items()))
+        self.state = None
+        self.rechecked = 0
+        if path is not None:
+            try:
+                with open(path, "rb") as f:
+                    version, fingerprint, state = pickle.load(f)
+                if (version, fingerprint) == (self.VERSION, self.fingerprint):
+                    self.state = state
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print("dropping broken validation state {}: {}".format(path, e))
+
+    def save(self):
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmppath = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(tmppath, "wb") as f:
+            pickle.dump((self.VERSION, self.fingerprint, self.state), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmppath, self.path)
+
+    def usable(self, start, keys):
+        """ can the last state be reused for a load that resumed after the mod start - 1 """
+        if self.state is None or keys is None or start == 0:
+            return False
+        old_keys = self.state['load_keys']
+        return old_keys is not None and len(old_keys) >= start and old_keys[start - 1] == keys[start - 1]
+
+    def __call__(self, ruleset, start = None, keys = None):
+        """ start, keys: what MERGE_STATS says about the load that produced the ruleset """
+        if start is None:
+            start, keys = MERGE_STATS.start, MERGE_STATS.keys
+        keysets = build_keysets(ruleset, self.keysets)
+        incremental = self.usable(start, keys)
+        if incremental:
+            old_entities = self.state['entities']
+            index = self.state['index']
+            dirty = set()
+            for name, keyset in keysets.items():
+                for key in keyset.symmetric_difference(self.state['keysets'].get(name, ())):
+                    dirty.update(index.get((name, key), ()))
+        else:
+            old_entities, index, dirty = {}, {}, set()
+
+        entities = {}
+        mod_meta = ruleset['_mod_meta']
+        self.rechecked = 0
+        for section, section_rules in rules_by_section(self.rules).items():
+            STRICT.set_context('after_load_checks', section)
+            pkey = PRIMARY_KEYS[section]
+            for entity in ruleset.get(section, ()):
+                name = entity.get(pkey)
+                ekey = (section, name)
+                old = old_entities.get(ekey)
+                # (mod index, [(keyset, key), ...], [error msg, ...])
+                if old is not None and ekey not in dirty and entity['_mod_index'] < start and old[0] < start:
+                    for msg in old[2]:
+                        STRICT(ConstraintViolation, msg)
+                    entities[ekey] = old
+                    continue
+                self.rechecked += 1
+                errors_before = len(STRICT.errors)
+                mod = mod_meta[entity['_mod_index']]['id']
+                refkeys = []
+                for rule in section_rules:
+                    rule.check(entity, keysets, mod, name)
+                    refkeys.extend(rule.refkeys(entity))
+                entities[ekey] = (entity['_mod_index'], refkeys, [e['msg'] for e in STRICT.errors[errors_before:]])
+                if old is not None:
+                    for rk in old[1]:
+                        index[rk].discard(ekey)
+                for rk in refkeys:
+                    index.setdefault(rk, set()).add(ekey)
+
+        for ekey, old in old_entities.items():
+            if ekey not in entities:
+                for rk in old[1]:
+                    index[rk].discard(ekey)
+
+        self.state = { 'load_keys': keys, 'keysets': keysets, 'entities': entities, 'index': index }
+        self.save()
+
+# references worth indexing that nothing validates (yet); see RulesetIndex
+INDEX_FIELDS = (
+    ('units', 'builtInWeapons'),
+    ('armors', 'corpseBattle'),
+    ('armors', 'corpseGeo'),
+    ('armors', 'units'),
+    ('alienRaces', 'members'),
+    ('crafts', 'weapons'),
+)
+
+class RulesetIndex(object):
+    """ Lookups over a merged ruleset, each built on first use:
+        - entity(section, key) through a primary key map per PRIMARY_KEYS collection
+        - defined(key): the collections that have an entity of that key
+        - refs(key): (section, name, field) of every entity referring to the key
+          through a field that VALIDATION, KEYSETS or INDEX_FIELDS know of
+        - keysets: the ones validate() checks against
+        The ruleset isn't expected to change under it; make a new one if it does.
+    """
+    def __init__(self, ruleset):
+        self.ruleset = ruleset
+        self.by_key = {}
+        self._refs = None
+        self._defined = None
+        self._keysets = None
+
+    def entities(self, section):
+        """ { key: entity } """
+        if section not in self.by_key:
+            primarykey = PRIMARY_KEYS.get(section)
+            if type(primarykey) is not str:
+                raise KeyError("{} is not a keyed collection".format(section))
+            self.by_key[section] = dict((item[primarykey], item) for item in self.ruleset.get(section, ()))
+        return self.by_key[section]
+
+    def entity(self, section, key):
+        return self.entities(section)[key]
+
+    @property
+    def keysets(self):
+        if self._keysets is None:
+            self._keysets = build_keysets(self.ruleset)
+        return self._keysets
+
+    @staticmethod
+    def ref_fields():
+        """ { section: [field, ...] } to index """
+        rv = {}
+        def add(section, field):
+            if field != PRIMARY_KEYS.get(section) and field not in rv.setdefault(section, []):
+                rv[section].append(field)
+        for rule in VALIDATION:
+            for field in getattr(rule, 'fields', ()):
+                add(rule.section, field)
+        for sources in KEYSETS.values():
+            for source in sources:
+                if type(source) is not str:
+                    add(*source)
+        for section, field in INDEX_FIELDS:
+            add(section, field)
+        return rv
+
+    def defined(self, key):
+        if self._defined is None:
+            self._defined = {}
+            for section, primarykey in PRIMARY_KEYS.items():
+                if type(primarykey) is str:
+                    for item in self.ruleset.get(section, ()):
+                        self._defined.setdefault(item[primarykey], []).append(section)
+        return self._defined.get(key, [])
+
+    def refs(self, key):
+        if self._refs is None:
+            self._refs = {}
+            for section, fields in self.ref_fields().items():
+                primarykey = PRIMARY_KEYS.get(section)
+                for item in self.ruleset.get(section, ()):
+                    for field in fields:
+                        for value in field_values(item, field):
+                            if type(value) is str:
+                                self._refs.setdefault(value, []).append((section, item.get(primarykey), field))
+        return self._refs.get(key, [])
+
+def after_load_checks(ruleset, incremental = None):
+    """ incremental: an IncrementalValidation to go through, else everything is checked """
+    if incremental is None:
+        validate(ruleset)
+    else:
+        incremental(ruleset)
+
+def load_ruleset(path, cache=True, jobs=1, all_languages=False):
+    """ load the ruleset from a self-contained installation and return it
+
+        parsed yaml and per-mod checkpoints are cached under user/minicom-cache unless cache is False
+        only the configured language's strings and FALLBACK_LANG's are kept unless all_languages
+
+        path can also be anything write_ruleset() wrote, see read_ruleset().
+    """
+    if os.path.isfile(path):
+        return read_ruleset(path)
+    finder = installation_finder(path, cache)
+    ruleset = load(finder, jobs, all_languages = all_languages)
+    print(PARSE_CACHE)
+    print(finder.dirindex)
+    return ruleset
+
+def installation_finder(path, cache=True):
+    """ Finder for a self-contained installation, with caches set up under its user/ dir """
     userdir = os.path.join(path, 'user')
-    finder = Finder(userdir, userdir, path)
+    cachedir = os.path.join(userdir, CACHE_DIRNAME) if cache else None
+    if cache:
+        PARSE_CACHE.open(os.path.join(cachedir, 'yaml'))
+    else:
+        PARSE_CACHE.close()
+    with PROFILE.phase('finder'):
+        finder = Finder(userdir, userdir, path, cachedir=cachedir)
     print(finder)
-    return load(finder)
+    return finder
+
+def archive_mtime(root):
+    """ mtime of the archive a zipped mod's root is in, 0 for the others. The archive's
+        members keep the mtime it had when mounted, so rules_mtime() can't see it replaced.
+    """
+    archive, member = zipfs.locate(root)
+    return 0 if archive is None else os.stat(archive.path).st_mtime
+
+def watch_stamp(finder, ruleset):
+    """ what to compare between polls; with no ruleset, i.e. the first load failed, every mod present is looked at """
+    if ruleset is None:
+        stamp = [(rules_mtime(path), zipfs.stat(path).st_mtime, archive_mtime(path)) for path in finder.modlist]
+    else:
+        stamp = [(rules_mtime(md['root']), archive_mtime(md['root'])) for md in ruleset['_mod_meta']]
+    return stamp + [os.stat(finder.cfgfile).st_mtime]
+
+def watch(finder, on_load, jobs = 1, interval = 0.5, idle = time.sleep, all_languages = False):
+    """ keep everything in memory and reload whenever an active mod's rules or options.cfg change.
+
+        Parsed documents are remembered so only changed files get parsed again, and
+        merging restarts from the first changed mod off in-memory checkpoints.
+        on_load(ruleset) gets called after every (re)load, idle(interval) between polls.
+        Runs until interrupted. A reload that fails, say on a half-saved rul file, gets
+        reported and the previous ruleset stays, on_load() isn't called for it.
+    """
+    PARSE_CACHE.remember()
+    checkpoints = Checkpoints()
+    STRICT.do_raise(False)
+    ruleset = None
+    while True:
+        st = time.time()
+        del STRICT.errors[:]
+        try:
+            ruleset = load(finder, jobs, checkpoints, all_languages)
+            on_load(ruleset)
+            print("\nReloaded in {:.2f} s, watching for changes. Ctrl-C to stop.".format(time.time() - st))
+        except Exception:
+            print("\n!!!!! RELOAD FAILED")
+            print(STRICT)
+            traceback.print_exc()
+            print("\nKeeping the previous ruleset, watching for changes. Ctrl-C to stop.")
+        sys.stdout.flush()
+        stamp = watch_stamp(finder, ruleset)
+        while watch_stamp(finder, ruleset) == stamp:
+            idle(interval)
+        finder.refresh()
+
+def _sorted_keys(a_dict):
+    # same as pprint does, mostly
+    try:
+        return sorted(a_dict)
+    except TypeError:
+        return sorted(a_dict, key = lambda k: (str(type(k)), repr(k)))
+
+def stream_pformat(f, obj, depth, indent = 0, width = 144):
+    """ write pprint.pformat(obj) to f as it goes instead of building the whole string.
+
+        Dicts and lists down to depth get written an item at a time, keys sorted,
+        anything deeper is pformat()ted whole. So memory use is bounded by
+        the largest item at depth, e.g. a single research topic.
+        The output is valid python and is stable wrt. dict insertion order.
+    """
+    if depth > 0 and type(obj) in (dict, list) and len(obj) > 0:
+        pad = ' ' * (indent + 4)
+        if type(obj) is dict:
+            f.write('{\n')
+            for k in _sorted_keys(obj):
+                f.write("{}{!r}: ".format(pad, k))
+                stream_pformat(f, obj[k], depth - 1, indent + 4, width)
+                f.write(',\n')
+            f.write(' ' * indent + '}')
+        else:
+            f.write('[\n')
+            for v in obj:
+                f.write(pad)
+                stream_pformat(f, v, depth - 1, indent + 4, width)
+                f.write(',\n')
+            f.write(' ' * indent + ']')
+    else:
+        text = pprint.pformat(obj, width = max(width - indent, 72))
+        f.write(text.replace('\n', '\n' + ' ' * indent))
+
+def write_pyvar(f, name, obj, depth):
+    """ name = obj, streamed """
+    f.write("{} = ".format(name))
+    stream_pformat(f, obj, depth)
+    f.write("\n")
+
+def section_hashes(ruleset, sections=None, hashes=None):
+    """ content hash of each top level section (all of them if sections is None) plus the OUTPUT_FORMAT.
+        hashes: already computed ones to pick from
+    """
+    rv = { '_format': OUTPUT_FORMAT }
+    for k in (ruleset.keys() if sections is None else sections):
+        if k not in ruleset:
+            continue
+        if hashes is not None and k in hashes:
+            rv[k] = hashes[k]
+        else:
+            rv[k] = hashlib.sha1(msgpack.packb(ruleset[k], use_bin_type=True, default=repr)).hexdigest()
+    return rv
 
-def write_rusted_terrains(ruleset, ofname="terrains"):
+class Manifest(object):
+    """ Sidecar json next to a writer's outputs: which section hashes each output was written from.
+
+        Lets the writers skip outputs whose input sections haven't changed, which keeps
+        their mtimes, and so the .pyc of ruleset.py and whatever else depends on them.
+    """
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path) as f:
+                self.outputs = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.outputs = {}
+
+    def previous(self, fname):
+        return self.outputs.get(os.path.basename(fname), {})
+
+    def unchanged(self, fname, hashes):
+        return os.path.exists(fname) and self.previous(fname) == hashes
+
+    def skip(self, fnames, hashes, force=False):
+        """ True if all of fnames are up to date wrt. hashes """
+        if force or not all(self.unchanged(fname, hashes) for fname in fnames):
+            return False
+        print("{}: unchanged, skipped".format(', '.join(fnames)))
+        return True
+
+    def record(self, fname, hashes):
+        self.outputs[os.path.basename(fname)] = hashes
+        tmppath = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(tmppath, "w") as f:
+            json.dump(self.outputs, f, indent=1, sort_keys=True)
+        os.replace(tmppath, self.path)
+
+TERRAIN_SECTIONS = ('terrains', 'crafts', 'ufos', 'extraSprites', '_palettes', 'MCDPatches')
+
+def write_rusted_terrains(ruleset, ofname="terrains", hashes=None, force=False):
     """ preprocess terrain defs for the rust deserealizer """
     # todo: mapscripts.
 
+    manifest = Manifest(ofname + ".manifest")
+    hashes = section_hashes(ruleset, TERRAIN_SECTIONS, hashes)
+    if manifest.skip([ofname + ".py", ofname + ".msgp"], hashes, force):
+        return
+
     all_terrain_defs = copy.copy(ruleset['terrains'])
     for craft in ruleset['crafts'] + ruleset['ufos']:
         if 'battlescapeTerrainData' in craft:
@@ -1307,32 +2341,133 @@ def write_rusted_terrains(ruleset, ofname="terrains"):
                 del exs[es['type']]['type']
 
     with open(ofname + ".py", "w") as f:
-        f.write("terrains = {\n")
-        f.write(pprint.pformat(rv, width=144)[1:])
+        write_pyvar(f, "terrains", rv, 2)
+    manifest.record(ofname + ".py", hashes)
     print("wrote", ofname + ".py")
 
     msgpack.pack(rv, open(ofname + ".msgp", "wb"))
+    manifest.record(ofname + ".msgp", hashes)
     print("wrote", ofname + ".msgp")
 
-def write_rusted_translations(ruleset, ofname="translations", fallback_lang="en_US"):
-    """ writes out all the translations merged with the fallback_lang if it's not None """
+def translation_table(ruleset, fallback_lang=FALLBACK_LANG):
+    """ extraStrings as one shared key list and a compact table per language:
 
-    fallback = {}
-    if fallback_lang is not None:
-        for ess in ruleset["extraStrings"]:
-            if ess['type'] == fallback_lang:
-                fallback = ess['strings']
-    rv = {}
-    for ess in ruleset["extraStrings"]:
-        rv[ess['type']] = copy.copy(fallback)
-        rv[ess['type']].update(ess['strings'])
+        { 'keys': [key, ...], 'fallback': fallback_lang,
+          'languages': { lang: { 'blob': utf-8 bytes, 'starts': [int, ...], 'lengths': [int, ...], 'other': [[i, value], ...] } } }
+
+        The i-th string of a language is blob[starts[i]:starts[i] + lengths[i]]; length -1 means
+        the language doesn't have it, or has the same as the fallback, so look there.
+        Values that aren't strings (plurals and such) are in 'other' with their key index;
+        a list and not a map, as msgpack, json and the like want string map keys.
+        Equal strings within a language are stored once. See TranslationTable for reading it.
+    """
+    langs = dict((ess['type'], ess['strings']) for ess in ruleset.get("extraStrings", ()))
+    fallback = langs.get(fallback_lang, {}) if fallback_lang is not None else {}
+    keys = sorted(set(k for strings in langs.values() for k in strings), key=str)
+    rv = { 'keys': keys, 'fallback': fallback_lang, 'languages': {} }
+    for lang, strings in langs.items():
+        blob = bytearray()
+        offsets = {}
+        starts, lengths, other = [], [], []
+        for i, k in enumerate(keys):
+            v = strings.get(k)
+            if v is None or (lang != fallback_lang and k in fallback and fallback[k] == v):
+                starts.append(0)
+                lengths.append(-1)
+            elif type(v) is not str:
+                other.append([i, v])
+                starts.append(0)
+                lengths.append(-1)
+            else:
+                b = v.encode('utf-8')
+                if b not in offsets:
+                    offsets[b] = len(blob)
+                    blob += b
+                starts.append(offsets[b])
+                lengths.append(len(b))
+        rv['languages'][lang] = { 'blob': bytes(blob), 'starts': starts, 'lengths': lengths, 'other': other }
+    return rv
+
+class TranslationTable(object):
+    """ Reads what translation_table() makes.
+
+        table.lang('de') is a read-only mapping of key to string that falls back
+        to the fallback language, then to nothing, at lookup time; nothing is copied.
+    """
+    class Layer(collections.abc.Mapping):
+        def __init__(self, table, lang):
+            self.table = table
+            self.data = table.languages[lang]
+            self.other = dict((i, v) for i, v in self.data['other'])
+            self.fallback = None
+            if lang != table.fallback and table.fallback in table.languages:
+                self.fallback = table.lang(table.fallback)
+
+        def own(self, i):
+            if i in self.other:
+                return self.other[i]
+            length = self.data['lengths'][i]
+            if length < 0:
+                raise KeyError(i)
+            start = self.data['starts'][i]
+            return self.data['blob'][start:start + length].decode('utf-8')
+
+        def __getitem__(self, key):
+            i = self.table.index[key]
+            try:
+                return self.own(i)
+            except KeyError:
+                if self.fallback is None:
+                    raise KeyError(key)
+                return self.fallback[key]
+
+        def __iter__(self):
+            for key in self.table.keys:
+                if key in self:
+                    yield key
+
+        def __len__(self):
+            return sum(1 for key in self)
+
+        def __contains__(self, key):
+            i = self.table.index.get(key)
+            if i is None:
+                return False
+            if i in self.other or self.data['lengths'][i] >= 0:
+                return True
+            return self.fallback is not None and key in self.fallback
+
+    def __init__(self, table):
+        self.keys = table['keys']
+        self.index = dict((k, i) for i, k in enumerate(self.keys))
+        self.fallback = table['fallback']
+        self.languages = table['languages']
+        self.layers = {}
+
+    def lang(self, lang):
+        if lang not in self.layers:
+            self.layers[lang] = self.Layer(self, lang)
+        return self.layers[lang]
+
+def write_rusted_translations(ruleset, ofname="translations", fallback_lang=FALLBACK_LANG, hashes=None, force=False):
+    """ writes out all the translations as a translation_table(), layered over fallback_lang if it's not None """
+
+    manifest = Manifest(ofname + ".manifest")
+    hashes = section_hashes(ruleset, ('extraStrings',), hashes)
+    hashes['_fallback_lang'] = fallback_lang
+    if manifest.skip([ofname + ".py", ofname + ".msgp"], hashes, force):
+        return
+
+    rv = translation_table(ruleset, fallback_lang)
 
     with open(ofname + ".py", "w") as f:
-        f.write("translations = {\n")
-        f.write(pprint.pformat(rv, width=144)[1:])
+        write_pyvar(f, "translations", rv, 2)
+    manifest.record(ofname + ".py", hashes)
     print("wrote", ofname + ".py")
 
-    msgpack.pack(rv, open(ofname + ".msgp", "wb"))
+    with open(ofname + ".msgp", "wb") as f:
+        msgpack.pack(rv, f, use_bin_type=True)
+    manifest.record(ofname + ".msgp", hashes)
     print("wrote", ofname + ".msgp")
 
 def write_rusted_basescape(ruleset, ofname="basescape"):
@@ -1353,16 +2488,157 @@ def write_rusted_basescape(ruleset, ofname="basescape"):
 
 
     with open(ofname + ".py", "w") as f:
-        f.write("basescape = {\n")
-        f.write(pprint.pformat(rv, width=144)[1:])
+        write_pyvar(f, "basescape", rv, 2)
     print("wrote", ofname + ".py")
 
     msgpack.pack(rv, open(ofname + ".msgp", "wb"))
     print("wrote", ofname + ".msgp")
 
-def write_ruleset(ruleset, ofname, imported_from=None, force=False, msgpacked=True, pickled=False):
+""" Sectioned ruleset container: every top level key is a msgpack chunk of its own,
+    so readers decode only the sections they touch.
+
+    preamble: magic, format version, reserved, index offset, index length
+    then the chunks back to back, then the index: msgpack { section: [ offset, length ] }
+"""
+SECTIONED_MAGIC = b'MINIRSEC'
+SECTIONED_VERSION = 1
+SECTIONED_PREAMBLE = struct.Struct('<8sIIQQ')
+
+def write_sectioned(ruleset, ofname, reuse=()):
+    """ reuse: sections to copy as is from the existing ofname instead of packing them again.
+        returns the number of sections packed.
+    """
+    old = None
+    if len(reuse) > 0 and os.path.exists(ofname):
+        try:
+            old = Ruleset(ofname)
+        except ValueError:
+            pass
+    index = {}
+    packed = 0
+    tmpname = "{}.{}.tmp".format(ofname, os.getpid())
+    with open(tmpname, "wb") as f:
+        f.write(SECTIONED_PREAMBLE.pack(SECTIONED_MAGIC, SECTIONED_VERSION, 0, 0, 0))
+        for k, v in ruleset.items():
+            if old is not None and k in reuse and k in old.index:
+                chunk = old.raw(k)
+            else:
+                chunk = msgpack.packb(v, use_bin_type=True)
+                packed += 1
+            index[k] = [f.tell(), len(chunk)]
+            f.write(chunk)
+        index_offset = f.tell()
+        packed_index = msgpack.packb(index, use_bin_type=True)
+        f.write(packed_index)
+        f.seek(0)
+        f.write(SECTIONED_PREAMBLE.pack(SECTIONED_MAGIC, SECTIONED_VERSION, 0, index_offset, len(packed_index)))
+    if old is not None:
+        old.close()
+    os.replace(tmpname, ofname)
+    return packed
+
+class Ruleset(collections.abc.Mapping):
+    """ Read-only ruleset backed by a memory-mapped sectioned file (see write_sectioned()).
+
+        A section is decoded on first access and kept; nothing else is touched.
+    """
+    def __init__(self, fname):
+        self.fname = fname
+        self.f = open(fname, "rb")
+        self.mm = mmap.mmap(self.f.fileno(), 0, access = mmap.ACCESS_READ)
+        magic, version, reserved, index_offset, index_length = SECTIONED_PREAMBLE.unpack_from(self.mm, 0)
+        if magic != SECTIONED_MAGIC:
+            raise ValueError("{} is not a sectioned ruleset".format(fname))
+        if version != SECTIONED_VERSION:
+            raise ValueError("{}: sectioned format version {}, expected {}".format(fname, version, SECTIONED_VERSION))
+        self.index = msgpack.unpackb(self.mm[index_offset:index_offset + index_length], raw = False)
+        self.decoded = {}
+
+    def close(self):
+        self.decoded = {}
+        self.mm.close()
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def raw(self, section):
+        """ packed bytes of a section """
+        offset, length = self.index[section]
+        return self.mm[offset:offset + length]
+
+    def __getitem__(self, section):
+        if section not in self.decoded:
+            self.decoded[section] = msgpack.unpackb(self.raw(section), raw = False, strict_map_key = False)
+        return self.decoded[section]
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+class StaleRuleset(Exception):
+    pass
+
+def sniff_ruleset(fname):
+    """ which of write_ruleset()'s formats is it: 'rsec', 'pickle', 'msgp' or 'py' """
+    with open(fname, "rb") as f:
+        head = f.read(len(SECTIONED_MAGIC))
+    if head == SECTIONED_MAGIC:
+        return 'rsec'
+    if len(head) > 1 and head[0] == 0x80 and 2 <= head[1] <= 5: # PROTO opcode
+        return 'pickle'
+    if len(head) > 0 and (0x80 <= head[0] <= 0x8f or head[0] in (0xde, 0xdf)): # msgpack maps
+        return 'msgp'
+    return 'py'
+
+def read_ruleset(fname, lazy=True):
+    """ read back what write_ruleset() wrote, in any of its formats.
+
+        msgpack gets int keys (extraSprites' files) back as ints.
+        Sectioned files come back as a lazy Ruleset unless lazy is False.
+        Anything not stamped with the current RULESET_SCHEMA raises StaleRuleset.
+    """
+    fmt = sniff_ruleset(fname)
+    print("reading {} ruleset from {}".format(fmt, fname))
+    if fmt == 'rsec':
+        ruleset = Ruleset(fname)
+        schema = ruleset.get('_schema')
+        if not lazy:
+            ruleset = dict(ruleset)
+    else:
+        if fmt == 'pickle':
+            with open(fname, "rb") as f:
+                ruleset = pickle.load(f)
+        elif fmt == 'msgp':
+            with open(fname, "rb") as f:
+                ruleset = msgpack.unpack(f, raw = False, strict_map_key = False)
+        else:
+            spec = importlib.util.spec_from_file_location("ruleset", fname)
+            if spec is None:
+                raise ImportError("Import from {} failed.".format(fname))
+            module = importlib.util.module_from_spec(spec) # python 3.5+, meaning trusty is out.
+            spec.loader.exec_module(module)
+            ruleset = module.ruleset
+        schema = ruleset.get('_schema')
+    if schema != RULESET_SCHEMA:
+        raise StaleRuleset("{} has ruleset schema {}, expected {}; regenerate it.".format(fname, schema, RULESET_SCHEMA))
+    return ruleset
+
+def write_ruleset(ruleset, ofname, imported_from=None, force=False, msgpacked=True, pickled=False, sectioned=False, hashes=None):
+    """ writes <basename>.py and optionally .pickle, .msgp and .rsec
+
+        outputs whose sections are unchanged since the last time are skipped unless force,
+        see Manifest; of the sectioned file only the changed sections are repacked.
+    """
     basename = ofname.rsplit('.', 1)[0]
     ofname = basename + ".py"
+    manifest = Manifest(basename + ".manifest")
+    hashes = section_hashes(ruleset, None, hashes)
 
     # don't overwrite the module we just imported by default - slows down the next import
     if ( imported_from is not None
@@ -1370,20 +2646,15 @@ def write_ruleset(ruleset, ofname, imported_from=None, force=False, msgpacked=Tr
          and os.path.abspath(imported_from) == os.path.abspath(ofname)):
         print("not overwriting {}".format(imported_from))
 
-    else:
+    elif not manifest.skip([ofname], hashes, force):
         with open(ofname, "w") as f:
-            f.write("ruleset = {\n ")
-            f.write(pprint.pformat(ruleset, width=144)[1:]) # [1:] skips the opening {
+            write_pyvar(f, "ruleset", ruleset, 2)
             f.write(textwrap.dedent("""
-                def get_trans(lang="{lang}", fallback = False):
-                    def find_lang(lname):
-                        for ess in ruleset["extraStrings"]:
-                            if ess['type'] == lname:
-                                return ess['strings']
-                        return {{}}
+                _strings = dict((ess['type'], ess['strings']) for ess in ruleset["extraStrings"])
 
-                    trans = find_lang(lang)
-                    falltrans = find_lang("{fblang}")
+                def get_trans(lang="{lang}", fallback = False):
+                    trans = _strings.get(lang, {{}})
+                    falltrans = _strings.get("{fblang}", {{}})
 
                     if fallback:
                         return lambda k : trans.get(k, falltrans.get(k, k))
@@ -1392,66 +2663,391 @@ def write_ruleset(ruleset, ofname, imported_from=None, force=False, msgpacked=Tr
 
                 """.format(fblang = FALLBACK_LANG,
                              lang = ruleset['_config']['options'].get('language', FALLBACK_LANG))))
+        manifest.record(ofname, hashes)
         print("\nwrote {}".format(ofname))
 
-    if pickled:
-        ofname = basename + '.pickle'
+    ofname = basename + '.pickle'
+    if pickled and not manifest.skip([ofname], hashes, force):
         pickle.dump(ruleset, open(ofname, "wb"))
+        manifest.record(ofname, hashes)
         print("wrote {}".format(ofname))
 
-    if msgpacked:
-        ofname = basename + '.msgp'
+    ofname = basename + '.msgp'
+    if msgpacked and not manifest.skip([ofname], hashes, force):
         msgpack.pack(ruleset, open(ofname, "wb"))
+        manifest.record(ofname, hashes)
         print("wrote {}".format(ofname))
 
+    ofname = basename + '.rsec'
+    if sectioned and not manifest.skip([ofname], hashes, force):
+        previous = manifest.previous(ofname) if not force else {}
+        if previous.get('_format') == OUTPUT_FORMAT:
+            reuse = set(k for k, v in hashes.items() if previous.get(k) == v)
+        else:
+            reuse = set()
+        packed = write_sectioned(ruleset, ofname, reuse)
+        manifest.record(ofname, hashes)
+        print("wrote {}, {} of {} sections changed".format(ofname, packed, len(ruleset)))
+
+def _sql_name(*parts):
+    return '"{}"'.format('__'.join(parts).replace('"', '""'))
+
+def _sql_unique(taken, *parts):
+    """ _sql_name(), numbered if the name is in taken already. sqlite ignores case in names,
+        so power and Power, a common typo in mods, would clash otherwise.
+    """
+    name = '__'.join(parts)
+    rv, n = name, 1
+    while rv.lower() in taken:
+        n += 1
+        rv = '{}__{}'.format(name, n)
+    taken.add(rv.lower())
+    return _sql_name(rv)
+
+def _sql_value(v):
+    """ scalars go in as they are, anything nested as json """
+    if v is None or type(v) in (str, int, float):
+        return v
+    if type(v) is bool:
+        return int(v)
+    return json.dumps(v, default=repr, sort_keys=True)
+
+def _fill_sqlite(db, ruleset):
+    """ the tables of write_sqlite() """
+    ref_fields = RulesetIndex.ref_fields()
+    taken = set(['mods', 'globals', 'strings', 'strings__key'])  # tables and indices share names
+    db.execute('create table mods (idx integer primary key, id, name, version, root)')
+    db.executemany('insert into mods values (?, ?, ?, ?, ?)',
+        ((i, md.get('id'), md.get('name'), md.get('version'), md.get('root')) for i, md in enumerate(ruleset.get('_mod_meta', ()))))
+    db.execute('create table globals (name primary key, value)')
+    for section, entities in ruleset.items():
+        primarykey = PRIMARY_KEYS.get(section)
+        if type(primarykey) is not str or type(entities) is not list:
+            if section != 'extraStrings':
+                db.execute('insert into globals values (?, ?)', (section, _sql_value(entities)))
+            continue
+        columns = { primarykey: True }
+        for entity in entities:
+            for k, v in entity.items():
+                columns[k] = columns.get(k, True) and (v is None or type(v) in (str, int, float, bool))
+        scalars = [k for k, scalar in columns.items() if scalar]
+        children = [k for k, scalar in columns.items() if not scalar]
+        table = _sql_unique(taken, section)
+        colnames = {}
+        names = set()
+        for k in scalars:
+            colnames[k] = _sql_unique(names, k)
+        db.execute('create table {} ({})'.format(table, ', '.join(
+            colnames[k] + (' primary key' if k == primarykey else '') for k in scalars)))
+        db.executemany('insert into {} values ({})'.format(table, ', '.join('?' * len(scalars))),
+            (tuple(_sql_value(entity.get(k)) for k in scalars) for entity in entities))
+        child_tables = {}
+        for field in children:
+            child = child_tables[field] = _sql_unique(taken, section, field)
+            db.execute('create table {} (owner, k, value)'.format(child))
+            def rows(field = field):
+                for entity in entities:
+                    v = entity.get(field)
+                    if v is None:
+                        continue
+                    if type(v) is list:
+                        for i, x in enumerate(v):
+                            yield entity[primarykey], i, _sql_value(x)
+                    elif type(v) is dict:
+                        for k, x in v.items():
+                            yield entity[primarykey], _sql_value(k), _sql_value(x)
+                    else:
+                        yield entity[primarykey], None, _sql_value(v)
+            db.executemany('insert into {} values (?, ?, ?)'.format(child), rows())
+            db.execute('create index {} on {} (owner)'.format(_sql_unique(taken, section, field, 'owner'), child))
+        indexed = set()
+        for field in ref_fields.get(section, ()):
+            field = field[:-2] if field.endswith('.*') else field
+            if field in indexed:
+                continue
+            indexed.add(field)
+            if field in child_tables:
+                # lists refer by value, maps like requiredItems by key
+                child = child_tables[field]
+                db.execute('create index {} on {} (value)'.format(_sql_unique(taken, section, field, 'value'), child))
+                db.execute('create index {} on {} (k)'.format(_sql_unique(taken, section, field, 'k'), child))
+            elif field in colnames and field != primarykey:
+                db.execute('create index {} on {} ({})'.format(_sql_unique(taken, section, field, 'idx'), table, colnames[field]))
+
+    db.execute('create table strings (lang, key, value, primary key (lang, key))')
+    db.executemany('insert or replace into strings values (?, ?, ?)',
+        ((ess['type'], k, _sql_value(v)) for ess in ruleset.get('extraStrings', ()) for k, v in ess['strings'].items()))
+    db.execute('create index strings__key on strings (key)')
+
+def write_sqlite(ruleset, ofname, hashes=None, force=False):
+    """ writes the ruleset as an sqlite database, for poking at with SQL.
+
+        - one table per keyed collection, named after it, with the primary key
+          and the fields that are scalars in every entity as columns
+        - a child table <collection>__<field> (owner, k, value) for every field that is a list
+          or a map somewhere: k is the position or the map key, value nested stuff as json
+        - strings (lang, key, value) from extraStrings, mods (idx, id, name, version, root) from _mod_meta
+        - globals (name, value) for the rest of the top level sections, as json
+        Names that differ from one already there only by case get __2, __3... appended.
+        Entities keep their _mod_index. Primary keys, owners and the reference fields
+        RulesetIndex knows of are indexed.
+    """
+    manifest = Manifest(ofname + ".manifest")
+    hashes = section_hashes(ruleset, None, hashes)
+    if manifest.skip([ofname], hashes, force):
+        return
+
+    tmpname = "{}.{}.tmp".format(ofname, os.getpid())
+    if os.path.exists(tmpname):
+        os.unlink(tmpname)
+    db = sqlite3.connect(tmpname)
+    try:
+        _fill_sqlite(db, ruleset)
+        db.commit()
+    except:
+        db.close()
+        os.unlink(tmpname)
+        raise
+    db.close()
+    os.replace(tmpname, ofname)
+    manifest.record(ofname, hashes)
+    print("wrote {}".format(ofname))
+
+class ServerRunning(Exception):
+    pass
+
+class RulesetServer(object):
+    """ Holds the merged ruleset and answers lookups over a unix socket, see ruleclient.py.
+
+        Requests and responses are msgpack maps, back to back on the stream:
+            { 'op': 'keys' }                                -> top level section names
+            { 'op': 'section', 'name': n }                  -> ruleset[n]
+            { 'op': 'entity', 'section': s, 'key': k }      -> the entity with primary key k in ruleset[s]
+            { 'op': 'refs', 'key': k }                      -> { 'defined': [section, ...], 'refs': [[section, name, field], ...] }
+            { 'op': 'strings', 'lang': l }                  -> extraStrings for language l
+            { 'op': 'trans' }                               -> { 'lang': configured, 'fallback': FALLBACK_LANG }
+        answered with { 'ok': result } or { 'error': message }.
+
+        Sections are packed once and the bytes are reused until the ruleset is replaced.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.ruleset = {}
+        self.packed = {}
+        self.index = RulesetIndex(self.ruleset)
+        if os.path.exists(path):
+            client = ruleclient.connect(path)
+            if client is not None:
+                client.close()
+                raise ServerRunning("another server is running on {}".format(path))
+            os.unlink(path) # stale
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(path)
+        self.sock.listen(8)
+        self.sock.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.sock, selectors.EVENT_READ, None)
+        print("serving on {}".format(path))
+
+    def set_ruleset(self, ruleset):
+        self.ruleset = ruleset
+        self.packed = {}
+        self.index = RulesetIndex(ruleset)
+
+    def close(self):
+        self.selector.close()
+        self.sock.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _strings(self, lang):
+        for ess in self.ruleset.get('extraStrings', ()):
+            if ess['type'] == lang:
+                return ess['strings']
+        return {}
+
+    def handle(self, req):
+        ok = msgpack.packb('ok')
+        try:
+            op = req['op']
+            if op == 'section':
+                name = req['name']
+                if name not in self.packed:
+                    self.packed[name] = msgpack.packb(self.ruleset[name], use_bin_type=True)
+                return b'\x81' + ok + self.packed[name]
+            elif op == 'keys':
+                rv = list(self.ruleset.keys())
+            elif op == 'entity':
+                rv = self.index.entity(req['section'], req['key'])
+            elif op == 'refs':
+                rv = { 'defined': self.index.defined(req['key']), 'refs': self.index.refs(req['key']) }
+            elif op == 'strings':
+                rv = self._strings(req['lang'])
+            elif op == 'trans':
+                rv = { 'lang': self.ruleset['_config']['options'].get('language', FALLBACK_LANG), 'fallback': FALLBACK_LANG }
+            else:
+                raise KeyError("unknown op {!r}".format(op))
+            return msgpack.packb({ 'ok': rv }, use_bin_type=True)
+        except Exception as e:
+            return msgpack.packb({ 'error': "{}: {}".format(type(e).__name__, e) }, use_bin_type=True)
+
+    def poll(self, timeout=None):
+        """ serve whatever comes in during timeout seconds, forever if None """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            left = None if deadline is None else deadline - time.time()
+            if left is not None and left <= 0:
+                return
+            for key, events in self.selector.select(left):
+                if key.data is None:
+                    conn, addr = self.sock.accept()
+                    conn.setblocking(False)
+                    self.selector.register(conn, selectors.EVENT_READ,
+                        msgpack.Unpacker(raw=False, strict_map_key=False, max_buffer_size=2**31-1))
+                    continue
+                conn, unpacker = key.fileobj, key.data
+                try:
+                    data = conn.recv(1 << 16)
+                except ConnectionError:
+                    data = b''
+                if not data:
+                    self.selector.unregister(conn)
+                    conn.close()
+                    continue
+                unpacker.feed(data)
+                conn.setblocking(True)
+                try:
+                    for req in unpacker:
+                        conn.sendall(self.handle(req))
+                except ConnectionError:
+                    pass
+                conn.setblocking(False)
+
+SUBCOMMANDS = {
+    'refs': 'refs',
+    'diff': 'rulediff',
+    'research': 'resgraph',
+    'costs': 'costs',
+}
+
 def main():
-    pa = argparse.ArgumentParser(sys.argv[0])
-    pa.add_argument("root", nargs='?', help="oxc root or a ruleset.py", default='.')
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        # modloader.py diff ... and such; they have their own args
+        sys.exit(importlib.import_module(SUBCOMMANDS[sys.argv[1]]).main(sys.argv[2:]))
+
+    pa = argparse.ArgumentParser(sys.argv[0], epilog="subcommands: {}; see modloader.py <subcommand> -h".format(', '.join(SUBCOMMANDS)))
+    pa.add_argument("root", nargs='?', help="oxc root or a ruleset written by -o: .py, .msgp, .pickle or .rsec", default='.')
     pa.add_argument("--output", "-o", help="output filename for the entire ruleset, suffix is dropped.")
-    pa.add_argument("--force", "-f", action="store_true", help="force overwriting the python ruleset module, if the data was imported from it")
+    pa.add_argument("--force", "-f", action="store_true", help="force overwriting the python ruleset module, if the data was imported from it, and outputs that are up to date")
     pa.add_argument("--pickle", "-p", action="store_true", help=" write pickled ruleset too")
     pa.add_argument("--msgpack", "-m", action="store_true", help=" write msgpacked ruleset too")
+    pa.add_argument("--sectioned", "-S", action="store_true", help=" write sectioned msgpacked ruleset (.rsec) too, see Ruleset")
     pa.add_argument("--terrains", "-t", type=str, help="output fname for the terrain data in rust deser format")
     pa.add_argument("--lang", "-l", type=str, help="output fname for translations data in rust deser format")
+    pa.add_argument("--sqlite", "-q", type=str, help="output fname for the ruleset as an sqlite database")
+    pa.add_argument("--all-languages", "-a", action="store_true", help="keep the strings of every language, not just the configured one and {}".format(FALLBACK_LANG))
     pa.add_argument("--strict", action="store_true", help="do not die on ruleset inconsistencies")
+    pa.add_argument("--no-cache", action="store_true", help="do not use or update the parsed yaml cache")
+    pa.add_argument("--jobs", "-j", type=int, default=1, help="parse rule files in this many processes, 0 for one per cpu")
+    pa.add_argument("--watch", "-w", action="store_true", help="stay running, reload and recheck when the mods change")
+    pa.add_argument("--serve", "-s", nargs='?', const='', metavar="SOCKET",
+        help="stay running and serve the ruleset to other tools, by default on user/{}/ruleset.sock".format(CACHE_DIRNAME))
+    pa.add_argument("--verbose", "-v", action="count", default=0, help="log each mod and file loaded, -vv each section and entity merged")
+    pa.add_argument("--profile", metavar="FILE", help="write per phase and per mod wall/cpu time and peak rss as json here")
     args = vars(pa.parse_args())
 
     STRICT.do_raise(args['strict'])
+    logging.basicConfig(format = "%(message)s", stream = sys.stdout,
+        level = (logging.WARNING, logging.INFO, logging.DEBUG)[min(args['verbose'], 2)])
+    if args['profile'] is not None:
+        PROFILE.enable()
+
+    def after_load(ruleset, imported_from = None):
+        hashes = None
+        if any(args[k] is not None for k in ('output', 'terrains', 'lang', 'sqlite')):
+            with PROFILE.phase('section_hashes'):
+                hashes = section_hashes(ruleset)
+
+        if args['output'] is not None:
+            with PROFILE.phase('write_ruleset'):
+                write_ruleset(ruleset, args['output'], imported_from,
+                    force=args['force'], msgpacked=args['msgpack'], pickled=args['pickle'], sectioned=args['sectioned'],
+                    hashes=hashes)
+
+        if args['terrains'] is not None:
+            with PROFILE.phase('write_rusted_terrains'):
+                write_rusted_terrains(ruleset, args['terrains'], hashes=hashes, force=args['force'])
+
+        if args['lang'] is not None:
+            with PROFILE.phase('write_rusted_translations'):
+                write_rusted_translations(ruleset, args['lang'], hashes=hashes, force=args['force'])
+
+        if args['sqlite'] is not None:
+            with PROFILE.phase('write_sqlite'):
+                write_sqlite(ruleset, args['sqlite'], hashes=hashes, force=args['force'])
+
+        with PROFILE.phase('after_load_checks'):
+            after_load_checks(ruleset, incremental)
+
+        print(STRICT)
+        if args['profile'] is not None:
+            PROFILE.dump(args['profile'])
+            PROFILE.reset()
+
+    root = args['root']
+    jobs = args['jobs'] or os.cpu_count()
+    incremental = None
+    if os.path.isdir(root):
+        incremental = IncrementalValidation(None if args['no_cache'] else os.path.join(root, 'user', CACHE_DIRNAME, 'validation'))
+    server = None
+    if args['serve'] is not None:
+        try:
+            server = RulesetServer(args['serve'] or ruleclient.socket_path(root if os.path.isdir(root) else '.'))
+        except ServerRunning as e:
+            pa.error(str(e))
+
+    if args['watch']:
+        if not os.path.isdir(root):
+            pa.error("--watch needs an oxc root")
+        def on_load(ruleset):
+            after_load(ruleset)
+            if server is not None:
+                server.set_ruleset(ruleset)
+        try:
+            watch(installation_finder(root, cache=not args['no_cache']), on_load, jobs,
+                    idle = time.sleep if server is None else server.poll, all_languages = args['all_languages'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if server is not None:
+                server.close()
+        return
 
-    root = args['root'][0]
     if os.path.isdir(root):
         print("modloading from {}".format(root))
         try:
-            ruleset = load_ruleset(root)
+            ruleset = load_ruleset(root, cache=not args['no_cache'], jobs=jobs, all_languages=args['all_languages'])
         except Exception as e:
             if e is not SystemExit:
                 print(STRICT)
             raise
         imported_from = None
     else:
-        spec = importlib.util.spec_from_file_location("ruleset", root)
-        if spec is None:
-            print("Import from {} failed.".format(root))
-        else:
-            print("importing {}".format(root))
-        module = importlib.util.module_from_spec(spec) # python 3.5+, meaning trusty is out.
-        spec.loader.exec_module(module)
-        imported_from = module.__file__
-        ruleset = module.ruleset
-
-    if args['output'] is not None:
-        write_ruleset(ruleset, args['output'], imported_from,
-            force=args['force'], msgpacked=args['msgpack'], pickled=args['pickle'])
-
-    if args['terrains'] is not None:
-        write_rusted_terrains(ruleset, args['terrains'])
+        with PROFILE.phase('read_ruleset'):
+            ruleset = read_ruleset(root, lazy = False)
+        imported_from = root if sniff_ruleset(root) == 'py' else None
 
-    if args['lang'] is not None:
-        write_rusted_translations(ruleset, args['lang'])
+    after_load(ruleset, imported_from)
 
-    after_load_checks(ruleset)
-
-    print(STRICT)
+    if server is not None:
+        server.set_ruleset(ruleset)
+        try:
+            server.poll()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+"""
+What is STR_X and what refers to it.
+
+    modloader.py refs STR_LASER_RIFLE STR_LASER_WEAPONS
+    modloader.py refs --root oxc/root STR_ALIEN_ALLOYS
+
+Answers from a running modloader.py --serve for the root if there is
+one, else loads the ruleset and builds a RulesetIndex.
+"""
+
+import os, sys, argparse, contextlib, json
+import modloader, ruleclient
+
+def lookup(source, keys):
+    """ { key: { 'defined': [section, ...], 'refs': [(section, name, field), ...] } }
+        source being a RulesetIndex or a RulesetClient
+    """
+    rv = {}
+    for key in keys:
+        if isinstance(source, modloader.RulesetIndex):
+            rv[key] = { 'defined': source.defined(key), 'refs': source.refs(key) }
+        else:
+            rv[key] = source.refs(key)
+    return rv
+
+def format_text(found):
+    lines = []
+    for key, d in found.items():
+        lines.append("{}: {}".format(key, "defined in " + ', '.join(d['defined']) if d['defined'] else "no entity of its own"))
+        by_field = {}
+        for section, name, field in d['refs']:
+            by_field.setdefault((section, field), []).append(name)
+        for (section, field), names in sorted(by_field.items()):
+            lines.append("  {}.{}: {}".format(section, field, ', '.join(sorted(map(str, names)))))
+        if len(d['refs']) == 0:
+            lines.append("  not referred to")
+    return "\n".join(lines)
+
+def main(argv = None):
+    pa = argparse.ArgumentParser("modloader.py refs", description = "where keys are defined and what refers to them")
+    pa.add_argument("keys", nargs = '+', help = "item, research, armor, base func... names")
+    pa.add_argument("--root", "-r", default = '.', help = "oxc root or a ruleset written by modloader.py -o")
+    pa.add_argument("--json", action = "store_true", help = "output json instead of text")
+    args = pa.parse_args(argv)
+
+    source = None
+    if os.path.isdir(args.root):
+        source = ruleclient.connect(ruleclient.socket_path(args.root))
+    if source is None:
+        modloader.STRICT.do_raise(False)
+        with contextlib.redirect_stdout(sys.stderr):
+            source = modloader.RulesetIndex(modloader.load_ruleset(args.root))
+
+    found = lookup(source, args.keys)
+    if args.json:
+        json.dump(found, sys.stdout, indent = 1)
+        print()
+    else:
+        print(format_text(found))
+    return 0 if all(d['defined'] or d['refs'] for d in found.values()) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -13,6 +13,9 @@ import sdl2.render
 
 import sdl2.sdlgfx
 import sdl2.sdlimage
+import sdl2.rwops
+
+import zipfs
 
 def init():
     sdl2.SDL_Init(sdl2.SDL_INIT_VIDEO | sdl2.SDL_INIT_NOPARACHUTE)
@@ -75,6 +78,9 @@ def bufpal2surface(buf, w, h, pal):
     return RGBAsurface(w, h, bar)
 
 def file2surface(fname):
+    if zipfs.locate(fname)[0] is not None:
+        # zipped mod resources: feed the bytes through an RWops
+        return sdl2.sdlimage.IMG_Load_RW(sdl2.rwops.rw_from_object(zipfs.open_file(fname)), True)
     return sdl2.sdlimage.IMG_Load(fname.encode("utf-8"))
 
 def chunkofsurface(surf, x, y, w, h):
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+
+"""
+Research tree as a graph: what can actually be researched starting from
+startingBase, in how many steps, which prerequisites go in circles and
+what gets you a given topic.
+
+    modloader.py research oxc/root --unreachable
+    modloader.py research ruleset.rsec --why STR_ALIEN_ORIGINS
+    modloader.py research oxc/root --cycles --depth
+
+The game's rules are an and/or graph, so it's kept as Horn clauses:
+'topic is researched if all of these are', one clause per way to get it.
+ - dependencies + requires (+ the item of the same name if needItem)
+ - unlocked by X: X + requires (+ item)
+ - X's lookup, getOneFree, sequentialGetOneFree, getOneFreeProtected (+ the protecting topic)
+ - a mission's unlockedResearch: nothing
+and the same for items, since needItem topics need one:
+ - in startingBase, or lying around in the field: alienDeployments itemSets,
+   live aliens (items named as units), corpses of armors: nothing
+ - manufacture producing it: its requires + requiredItems
+ - buyable (costBuy): requiresBuy
+Reachability is then the usual counter propagation, linear in the size of
+the clauses, and breadth first so the step a topic is reached at is its depth.
+The field items are a guess: whether the missions that drop them ever happen isn't modelled.
+"""
+
+import sys, argparse, contextlib, collections
+import modloader
+
+RESEARCH = 'r'
+ITEM = 'i'
+
+def _names(v):
+    """ a string, a list of them or a dict keyed by them """
+    if v is None:
+        return []
+    if type(v) is str:
+        return [v]
+    return list(v)
+
+def cycles(edges):
+    """ strongly connected components with a cycle in them, edges being { node: [successors] }.
+        Tarjan's, without recursion since real trees are deep.
+    """
+    index = {}
+    lowlink = {}
+    on_stack = set()
+    stack = []
+    rv = []
+    counter = 0
+    for root in edges:
+        if root in index:
+            continue
+        work = [(root, 0)]
+        while work:
+            node, i = work.pop()
+            if i == 0:
+                index[node] = lowlink[node] = counter
+                counter += 1
+                stack.append(node)
+                on_stack.add(node)
+            succ = edges.get(node, ())
+            recurse = False
+            while i < len(succ):
+                nxt = succ[i]
+                i += 1
+                if nxt not in index:
+                    work.append((node, i))
+                    work.append((nxt, 0))
+                    recurse = True
+                    break
+                if nxt in on_stack:
+                    lowlink[node] = min(lowlink[node], index[nxt])
+            if recurse:
+                continue
+            if lowlink[node] == index[node]:
+                scc = []
+                while True:
+                    w = stack.pop()
+                    on_stack.discard(w)
+                    scc.append(w)
+                    if w == node:
+                        break
+                if len(scc) > 1 or node in succ:
+                    rv.append(scc)
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+    return rv
+
+def cycle_path(edges, scc):
+    """ a shortest way around from the first of scc, alphabetically, back to it, staying within scc:
+        [a, b, ..., a]
+    """
+    members = set(scc)
+    start = min(scc)
+    came_from = {}
+    queue = collections.deque([start])
+    while queue:
+        node = queue.popleft()
+        for nxt in edges.get(node, ()):
+            if nxt == start:
+                path = [start]  # backwards
+                while node != start:
+                    path.append(node)
+                    node = came_from[node]
+                path.append(start)
+                return path[::-1]
+            if nxt in members and nxt not in came_from:
+                came_from[nxt] = node
+                queue.append(nxt)
+    return [start]
+
+class ResearchGraph(object):
+    def __init__(self, ruleset):
+        self.topics = dict((r['name'], r) for r in ruleset.get('research', ()))
+        self.items = dict((i['type'], i) for i in ruleset.get('items', ()))
+        # atom -> [(how, body atoms), ...]; atoms are (RESEARCH, name) or (ITEM, name)
+        self.clauses = collections.defaultdict(list)
+        self.build(ruleset)
+        self._depth = None
+
+    def clause(self, head, how, body):
+        self.clauses[head].append((how, tuple(body)))
+
+    def gate(self, name):
+        """ what a topic needs on top of being unlocked or having its dependencies done """
+        topic = self.topics[name]
+        rv = [(RESEARCH, r) for r in _names(topic.get('requires'))]
+        if topic.get('needItem', False):
+            rv.append((ITEM, name))
+        return rv
+
+    def build(self, ruleset):
+        for name, topic in self.topics.items():
+            head = (RESEARCH, name)
+            self.clause(head, 'dependencies', [(RESEARCH, d) for d in _names(topic.get('dependencies'))] + self.gate(name))
+            for u in _names(topic.get('unlocks')):
+                if u in self.topics:
+                    self.clause((RESEARCH, u), 'unlocked by ' + name, [head] + self.gate(u))
+            if 'lookup' in topic:
+                self.clause((RESEARCH, topic['lookup']), 'lookup', [head])
+            for free in _names(topic.get('getOneFree')) + _names(topic.get('sequentialGetOneFree')):
+                self.clause((RESEARCH, free), 'getOneFree', [head])
+            for protector, frees in topic.get('getOneFreeProtected', {}).items():
+                for free in _names(frees):
+                    self.clause((RESEARCH, free), 'getOneFreeProtected', [head, (RESEARCH, protector)])
+
+        for deployment in ruleset.get('alienDeployments', ()):
+            if 'unlockedResearch' in deployment:
+                self.clause((RESEARCH, deployment['unlockedResearch']), 'mission ' + deployment['type'], [])
+            for data in deployment.get('data', ()):
+                for item_set in data.get('itemSets', ()):
+                    for item in item_set:
+                        self.clause((ITEM, item), 'found in ' + deployment['type'], [])
+
+        starting_items = ruleset.get('startingBase', {}).get('items', {})
+        for item in _names(starting_items):
+            self.clause((ITEM, item), 'startingBase', [])
+        for unit in ruleset.get('units', ()):
+            if unit['type'] in self.items:
+                self.clause((ITEM, unit['type']), 'captured alive', [])
+        for armor in ruleset.get('armors', ()):
+            for corpse in _names(armor.get('corpseBattle')) + _names(armor.get('corpseGeo')):
+                self.clause((ITEM, corpse), 'corpse of ' + armor['type'], [])
+        for project in ruleset.get('manufacture', ()):
+            body = [(RESEARCH, r) for r in _names(project.get('requires'))]
+            body += [(ITEM, i) for i in _names(project.get('requiredItems'))]
+            for item in _names(project.get('producedItems', { project['name']: 1 })):
+                self.clause((ITEM, item), 'manufacture ' + project['name'], body)
+        for name, item in self.items.items():
+            if item.get('costBuy', 0) > 0:
+                self.clause((ITEM, name), 'buy', [(RESEARCH, r) for r in _names(item.get('requiresBuy'))])
+
+    def depth(self):
+        """ { atom: step it's first reached at } for everything reachable.
+            Counter propagation in FIFO order: a clause fires when the last of its body
+            comes out of the queue, and that one has the largest depth of the body.
+        """
+        if self._depth is not None:
+            return self._depth
+        waiting = {}                           # clause id -> body atoms not reached yet
+        watchers = collections.defaultdict(list)  # atom -> clause ids with it in the body
+        heads = []
+        rv = {}
+        queue = collections.deque()
+        for head, clauses in self.clauses.items():
+            for how, body in clauses:
+                cid = len(heads)
+                heads.append(head)
+                body = set(body)
+                waiting[cid] = len(body)
+                for atom in body:
+                    watchers[atom].append(cid)
+                if len(body) == 0 and head not in rv:
+                    rv[head] = 0
+                    queue.append(head)
+        while queue:
+            atom = queue.popleft()
+            for cid in watchers.get(atom, ()):
+                waiting[cid] -= 1
+                if waiting[cid] == 0 and heads[cid] not in rv:
+                    rv[heads[cid]] = rv[atom] + 1
+                    queue.append(heads[cid])
+        self._depth = rv
+        return rv
+
+    def reachable(self, name):
+        return (RESEARCH, name) in self.depth()
+
+    def unreachable(self):
+        depth = self.depth()
+        return [name for name in self.topics if (RESEARCH, name) not in depth]
+
+    def topic_depths(self):
+        depth = self.depth()
+        return dict((name, depth[(RESEARCH, name)]) for name in self.topics if (RESEARCH, name) in depth)
+
+    def unlocked_by(self, name, kind = RESEARCH):
+        """ [(how, [atoms]), ...]: each way to get the topic or item """
+        return self.clauses.get((kind, name), [])
+
+    def prerequisite_edges(self):
+        """ topic -> topics it can't do without: dependencies and requires """
+        rv = {}
+        for name, topic in self.topics.items():
+            rv[name] = [d for d in _names(topic.get('dependencies')) + _names(topic.get('requires')) if d in self.topics]
+        return rv
+
+    def cycles(self):
+        """ circular dependencies/requires, see cycles(); [(one cycle through it, the whole scc), ...] """
+        edges = self.prerequisite_edges()
+        return [(cycle_path(edges, scc), scc) for scc in cycles(edges)]
+
+def _fmt_atom(atom):
+    return atom[1] if atom[0] == RESEARCH else "item " + atom[1]
+
+def main(argv = None):
+    pa = argparse.ArgumentParser("modloader.py research", description = "research tree reachability, depth and cycles")
+    pa.add_argument("root", help = "oxc root or a ruleset written by modloader.py -o")
+    pa.add_argument("--unreachable", "-u", action = "store_true", help = "list topics that can't be reached from startingBase")
+    pa.add_argument("--cycles", "-c", action = "store_true", help = "list circular dependencies/requires; A -> B is A needs B")
+    pa.add_argument("--depth", "-d", action = "store_true", help = "list reachable topics by the step they're reached at")
+    pa.add_argument("--why", "-w", action = "append", metavar = "TOPIC", help = "what gets you this topic; repeatable")
+    args = pa.parse_args(argv)
+
+    modloader.STRICT.do_raise(False)
+    with contextlib.redirect_stdout(sys.stderr):
+        ruleset = modloader.load_ruleset(args.root)
+    graph = ResearchGraph(ruleset)
+    depths = graph.topic_depths()
+    print("{} topics, {} reachable".format(len(graph.topics), len(depths)))
+
+    if args.depth:
+        for name, d in sorted(depths.items(), key = lambda kv: (kv[1], kv[0])):
+            print("{:4} {}".format(d, name))
+    if args.unreachable:
+        for name in sorted(graph.unreachable()):
+            print("unreachable: {}".format(name))
+    if args.cycles:
+        for path, scc in graph.cycles():
+            print("cycle: {}".format(' -> '.join(path)))
+            if len(scc) > len(path) - 1:
+                print("  one of {} topics going in circles: {}".format(len(scc), ', '.join(sorted(scc))))
+    for name in args.why or ():
+        print("{}: {}".format(name, "step {}".format(depths[name]) if name in depths else "unreachable"))
+        for how, body in graph.unlocked_by(name):
+            print("  {}: {}".format(how, ', '.join(_fmt_atom(a) for a in body) or '-'))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+    Client side of the modloader ruleset server (modloader.py --serve).
+
+    The server holds the merged ruleset in memory, so a tool run costs a
+    round trip or three instead of a full load. Requests and responses are
+    msgpack maps, back to back on a unix socket.
+
+    ruleset_module() is a drop-in for 'import ruleset': it returns a client
+    that has .ruleset and .get_trans() if the server is up, else imports
+    the generated ruleset.py.
+"""
+
+import os, socket, collections.abc, importlib
+import msgpack
+
+CACHE_DIRNAME = 'minicom-cache' # under the userdir of the installation; modloader.py has it from here
+
+def socket_path(root='.'):
+    """ where the server for an installation listens; MINICOM_SOCKET overrides """
+    return os.environ.get('MINICOM_SOCKET', os.path.join(root, 'user', CACHE_DIRNAME, 'ruleset.sock'))
+
+class ServerError(Exception):
+    pass
+
+class RulesetClient(collections.abc.Mapping):
+    """ Read-only mapping of section name to section, fetched on first access """
+    def __init__(self, path=None):
+        self.path = socket_path() if path is None else path
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.sock.connect(self.path)
+        except:
+            self.sock.close()
+            raise
+        self.unpacker = msgpack.Unpacker(raw=False, strict_map_key=False, max_buffer_size=2**31-1)
+        self.sections = {}
+        self._keys = None
+
+    @property
+    def ruleset(self):
+        return self
+
+    def close(self):
+        self.sock.close()
+
+    def call(self, op, **kwargs):
+        kwargs['op'] = op
+        self.sock.sendall(msgpack.packb(kwargs, use_bin_type=True))
+        while True:
+            for resp in self.unpacker:
+                if 'error' in resp:
+                    raise ServerError(resp['error'])
+                return resp['ok']
+            data = self.sock.recv(1 << 20)
+            if not data:
+                raise ServerError("server closed the connection")
+            self.unpacker.feed(data)
+
+    def keys(self):
+        if self._keys is None:
+            self._keys = self.call('keys')
+        return self._keys
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __getitem__(self, section):
+        if section not in self.sections:
+            if section not in self.keys():
+                raise KeyError(section)
+            self.sections[section] = self.call('section', name=section)
+        return self.sections[section]
+
+    def entity(self, section, key):
+        """ one item/research topic/whatever by its primary key, without fetching the section """
+        return self.call('entity', section=section, key=key)
+
+    def refs(self, key):
+        """ { 'defined': [section, ...], 'refs': [(section, name, field), ...] }, see RulesetIndex """
+        return self.call('refs', key=key)
+
+    def strings(self, lang):
+        return self.call('strings', lang=lang)
+
+    def get_trans(self, lang=None, fallback=False):
+        """ same as the one in the generated ruleset.py """
+        info = self.call('trans')
+        trans = self.strings(info['lang'] if lang is None else lang)
+        falltrans = self.strings(info['fallback'])
+        if fallback:
+            return lambda k : trans.get(k, falltrans.get(k, k))
+        else:
+            return lambda k : trans.get(k, k)
+
+def connect(path=None):
+    """ returns a RulesetClient or None if the server isn't running """
+    try:
+        return RulesetClient(path)
+    except (OSError, AttributeError):
+        # OSError: nothing there, nobody listening, or a path through a file like ruleset.msgp
+        # AttributeError: no AF_UNIX on this platform
+        return None
+
+def ruleset_module(path=None, module='ruleset'):
+    client = connect(path)
+    if client is not None:
+        return client
+    return importlib.import_module(module)
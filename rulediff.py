@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+"""
+Entity-level diff between two merged rulesets.
+
+    modloader.py diff old.rsec new/oxc/root [--json]
+
+Either side can be anything modloader can read: an installation dir or
+any of write_ruleset()'s outputs. Keyed collections are matched on their
+PRIMARY_KEYS key, so the cost is linear in the number of entities.
+extraStrings are compared string by string per language, other lists of
+typed dicts (extraSprites) by type and occurrence.
+"""
+
+import sys, argparse, contextlib, json, pprint
+import modloader
+
+MISSING = object()
+
+def entities(section_name, section):
+    """ { key: entity } for a section, or None if it isn't a collection of entities """
+    primarykey = modloader.PRIMARY_KEYS.get(section_name)
+    if section_name == 'extraStrings':
+        rv = {}
+        for ess in section:
+            for k, v in ess['strings'].items():
+                rv["{}:{}".format(ess['type'], k)] = v
+        return rv
+    if type(section) is not list:
+        return None
+    if type(primarykey) is str:
+        return dict((item[primarykey], item) for item in section)
+    if all(type(item) is dict and 'type' in item for item in section):
+        rv = {}
+        seen = {}
+        for item in section:
+            n = seen.get(item['type'], 0)
+            seen[item['type']] = n + 1
+            rv[item['type'] if n == 0 else "{}#{}".format(item['type'], n)] = item
+        return rv
+    return None
+
+def diff_fields(old, new, ignore=(), prefix=''):
+    """ { 'dotted.field.path': (old, new) } with MISSING for absent fields; lists compare whole """
+    rv = {}
+    if type(old) is not dict or type(new) is not dict:
+        if old != new:
+            rv[prefix or '.'] = (old, new)
+        return rv
+    for k in old.keys() | new.keys():
+        if k in ignore:
+            continue
+        o, n = old.get(k, MISSING), new.get(k, MISSING)
+        if o == n:
+            continue
+        path = "{}.{}".format(prefix, k) if prefix else str(k)
+        if type(o) is dict and type(n) is dict:
+            rv.update(diff_fields(o, n, ignore, path))
+        else:
+            rv[path] = (o, n)
+    return rv
+
+def diff_rulesets(old, new, sections=None, ignore=('_mod_index',)):
+    """ { section: { 'added': [keys], 'removed': [keys], 'modified': { key: { field: (old, new) } } } }
+        for sections that differ. Sections that aren't entity collections have a single
+        entity named after the section.
+    """
+    rv = {}
+    names = [k for k in list(old.keys()) + [k for k in new.keys() if k not in old] if k not in ignore]
+    for name in names:
+        if sections is not None and name not in sections:
+            continue
+        osec, nsec = old.get(name, MISSING), new.get(name, MISSING)
+        if osec == nsec:
+            continue
+        oents = entities(name, osec) if osec is not MISSING else {}
+        nents = entities(name, nsec) if nsec is not MISSING else {}
+        if oents is None or nents is None:
+            oents = {} if osec is MISSING else { name: osec }
+            nents = {} if nsec is MISSING else { name: nsec }
+        added = [k for k in nents if k not in oents]
+        removed = [k for k in oents if k not in nents]
+        modified = {}
+        for k, oent in oents.items():
+            if k in nents and oent != nents[k]:
+                fields = diff_fields(oent, nents[k], ignore)
+                if len(fields) > 0:
+                    modified[k] = fields
+        if added or removed or modified:
+            rv[name] = { 'added': added, 'removed': removed, 'modified': modified }
+    return rv
+
+def _fmt(v):
+    return '(none)' if v is MISSING else pprint.pformat(v, width=120, compact=True)
+
+def format_text(diff):
+    lines = []
+    for name, d in diff.items():
+        lines.append("{}: +{} -{} ~{}".format(name, len(d['added']), len(d['removed']), len(d['modified'])))
+        for k in d['added']:
+            lines.append("  + {}".format(k))
+        for k in d['removed']:
+            lines.append("  - {}".format(k))
+        for k, fields in d['modified'].items():
+            lines.append("  ~ {}".format(k))
+            for field in sorted(fields):
+                o, n = fields[field]
+                lines.append("      {}: {} -> {}".format(field, _fmt(o), _fmt(n)))
+    return "\n".join(lines)
+
+def to_json(diff):
+    def conv(v):
+        return None if v is MISSING else v
+    rv = {}
+    for name, d in diff.items():
+        rv[name] = {
+            'added': d['added'],
+            'removed': d['removed'],
+            'modified': dict((k, dict((f, { 'old': conv(o), 'new': conv(n) }) for f, (o, n) in fields.items()))
+                                for k, fields in d['modified'].items()) }
+    return rv
+
+def main(argv=None):
+    pa = argparse.ArgumentParser("modloader.py diff", description="compare two merged rulesets entity by entity")
+    pa.add_argument("old", help="oxc root or a ruleset written by modloader.py -o")
+    pa.add_argument("new", help="oxc root or a ruleset written by modloader.py -o")
+    pa.add_argument("--json", action="store_true", help="output json instead of text")
+    pa.add_argument("--section", action="append", help="only compare this section; repeatable")
+    pa.add_argument("--with-mod-index", action="store_true", help="also report _mod_index changes")
+    pa.add_argument("--all-languages", action="store_true", help="compare strings of every language, not just the configured ones")
+    args = pa.parse_args(argv)
+
+    modloader.STRICT.do_raise(False)
+    with contextlib.redirect_stdout(sys.stderr): # keep the loader chatter out of the report
+        old = modloader.load_ruleset(args.old, all_languages=args.all_languages)
+        new = modloader.load_ruleset(args.new, all_languages=args.all_languages)
+
+    diff = diff_rulesets(old, new, args.section, () if args.with_mod_index else ('_mod_index',))
+    if args.json:
+        json.dump(to_json(diff), sys.stdout, indent=1, default=repr)
+        print()
+    else:
+        print(format_text(diff) if diff else "no differences")
+    return 1 if diff else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
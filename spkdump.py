@@ -10,6 +10,7 @@ import math, pickle, pprint, sys, os, collections, time
 import render2d
 from render2d import bufpal2surface, bufpal2palsurf, file2surface, chunkofsurface
 import fileformats
+import zipfs
 
 from ctypes import POINTER, c_int, c_char_p
 from sdl2 import SDL_Surface, SDL_RWops
@@ -27,7 +28,8 @@ def save_png(surf, fname):
     sdl2.SDL_RWclose(rwops)
     fobj.close()
 
-import ruleset
+import ruleclient
+ruleset = ruleclient.ruleset_module() # the modloader server if it's up, else ruleset.py
 tr = ruleset.get_trans(fallback=True)
 rs = ruleset.ruleset
 
@@ -140,7 +142,7 @@ for es in rs['extraSprites']:
     except KeyError:
         print(es['type'])
         continue
-    data = open(fname, 'rb').read()
+    data = zipfs.read(fname)
     if rtype == 'SCR' and not fname.endswith('.dat'):
         print ("{} bytes from {} ptype={}".format(len(data), fname, ptype))
         surf = bufpal2palsurf(data, w, h, pdata)
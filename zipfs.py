@@ -0,0 +1,131 @@
+"""
+    Files inside .zip archives, addressed by plain paths.
+
+    Once an archive is mounted, '/some/where/Mod.zip/Ruleset/items.rul' refers
+    to the 'Ruleset/items.rul' member. The functions below take such paths
+    or ordinary ones and do the right thing for both, so the modloader
+    and the fileformats loaders need not care where a mod came from.
+
+    Listings come from the archive's central directory; nothing is extracted.
+"""
+
+import os, io, zipfile, collections
+
+Stat = collections.namedtuple('Stat', 'st_size st_mtime st_mtime_ns')
+
+class ZipArchive(object):
+    def __init__(self, path):
+        self.path = path
+        self.zf = zipfile.ZipFile(path)
+        st = os.stat(path)
+        self.mtime = st.st_mtime
+        self.mtime_ns = st.st_mtime_ns
+        self.members = {}              # member path -> ZipInfo
+        self.listings = { '': {} }     # member dir path -> { name: is_dir }
+
+        for zi in self.zf.infolist():
+            member = zi.filename.replace('\\', '/').strip('/')
+            if member == '':
+                continue
+            if not zi.is_dir():
+                self.members[member] = zi
+            # zips do not necessarily have entries for dirs, so make them up
+            parts = member.split('/')
+            for i in range(len(parts)):
+                parent = '/'.join(parts[:i])
+                is_dir = i < len(parts) - 1 or zi.is_dir()
+                self.listings.setdefault(parent, {})
+                self.listings[parent][parts[i]] = self.listings[parent].get(parts[i], False) or is_dir
+                if is_dir:
+                    self.listings.setdefault('/'.join(parts[:i+1]), {})
+
+    def isdir(self, member):
+        return member in self.listings
+
+    def listdir(self, member):
+        """ [ (name, is_dir), ... ] """
+        try:
+            return list(self.listings[member].items())
+        except KeyError:
+            raise FileNotFoundError(os.path.join(self.path, member))
+
+    def open(self, member):
+        try:
+            return self.zf.open(self.members[member])
+        except KeyError:
+            raise FileNotFoundError(os.path.join(self.path, member))
+
+    def stat(self, member):
+        if member in self.members:
+            return Stat(self.members[member].file_size, self.mtime, self.mtime_ns)
+        if member in self.listings:
+            return Stat(0, self.mtime, self.mtime_ns)
+        raise FileNotFoundError(os.path.join(self.path, member))
+
+_archives = {}
+
+def mount(path):
+    """ make the archive's contents addressable under its path; remounts it if it changed """
+    path = os.path.normpath(path)
+    if path not in _archives or _archives[path].mtime_ns != os.stat(path).st_mtime_ns:
+        _archives[path] = ZipArchive(path)
+    return _archives[path]
+
+def unmount_all():
+    """ forget the mounted archives without closing them; for a forked process,
+        whose inherited ZipFiles share their file offsets with the parent's
+    """
+    _archives.clear()
+
+def locate(path):
+    """ returns (archive, member path) for paths inside an archive, else (None, path).
+        Archives not mounted yet get mounted on the way, so paths out of a written
+        ruleset work in a fresh process too.
+    """
+    if len(_archives) == 0 and '.zip' not in path.lower():
+        return None, path
+    path = os.path.normpath(path)
+    head, members = path, []
+    while True:
+        if head in _archives:
+            return _archives[head], '/'.join(reversed(members))
+        if len(members) > 0 and head.lower().endswith('.zip') and os.path.isfile(head):
+            return mount(head), '/'.join(reversed(members))
+        head, tail = os.path.split(head)
+        if tail == '':
+            return None, path
+        members.append(tail)
+
+def open_file(path):
+    """ open() in binary mode, for archive members too """
+    archive, member = locate(path)
+    if archive is None:
+        return io.open(path, "rb")
+    return archive.open(member)
+
+def read(path):
+    with open_file(path) as f:
+        return f.read()
+
+def stat(path):
+    archive, member = locate(path)
+    if archive is None:
+        return os.stat(path)
+    return archive.stat(member)
+
+def isdir(path):
+    archive, member = locate(path)
+    if archive is None:
+        return os.path.isdir(path)
+    return archive.isdir(member)
+
+def scandir(path):
+    """ [ (name, is_dir), ... ] """
+    archive, member = locate(path)
+    if archive is None:
+        with os.scandir(path) as it:
+            return [(de.name, de.is_dir()) for de in it]
+    return archive.listdir(member)
+
+def listdir(path):
+    return [name for name, is_dir in scandir(path)]